@@ -1,6 +1,10 @@
 import json
 import os
+import secrets
+import tempfile
 import xml.etree.ElementTree as ET
+import zipfile
+from xml.sax.saxutils import quoteattr
 
 import requests
 
@@ -8,43 +12,202 @@ RP_API_KEY: str | None = os.getenv("rp_api_key")
 RP_ENDPOINT: str | None = os.getenv("rp_endpoint")
 RP_PROJECT: str | None = os.getenv("rp_project")
 
+LAUNCH_NAME = "Kubernetes E2E Testing"
+CONTAINERS = ("testsuites", "testsuite")
+CHUNK_SIZE = 1024 * 1024
 
-def filter_skipped_tests(input_file: str) -> ET.Element:
+
+class _Container:
+    """
+    Start tag of a testsuites or testsuite element in one part.
+
+    The counters and time of the tag are those of the test cases written
+    into it in that part, skipped ones are not written.
+    """
+
+    COUNTERS = ("tests", "failures", "errors", "skipped")
+
+    def __init__(self, tag: str, attrib: dict[str, str]) -> None:
+        self.tag = tag
+        self.attrib = attrib
+        self.counts = dict.fromkeys(self.COUNTERS, 0)
+        self.time = 0.0
+
+    def count(self, testcase: ET.Element) -> None:
+        self.counts["tests"] += 1
+        self.counts["failures"] += testcase.find("failure") is not None
+        self.counts["errors"] += testcase.find("error") is not None
+        self.time += float(testcase.get("time") or 0)
+
+    def __str__(self) -> str:
+        attrib = {**self.attrib, **{key: str(self.counts[key]) for key in self.COUNTERS if key in self.attrib}}
+        if "time" in attrib:
+            attrib["time"] = f"{self.time:.3f}"
+        return f"<{self.tag}{''.join(f' {key}={quoteattr(value)}' for key, value in attrib.items())}>"
+
+
+class _Part:
+    """
+    A zip archive holding one filtered JUnit XML file.
+
+    The content is streamed to a temporary file, and the start tags of the
+    containers are only written with their counters once the part is
+    complete, when the archive is written.
+    """
+
+    def __init__(self, directory: str, number: int, open_tags: list[tuple[str, dict[str, str]]]) -> None:
+        self.path = os.path.join(directory, f"part-{number:03d}.zip")
+        self.testcases = 0
+        self._body = tempfile.TemporaryFile(dir=directory)
+        # Containers with the offset of the body their start tag goes to
+        self._starts = []
+        self._open = []
+        for tag, attrib in open_tags:
+            self.start(tag, attrib)
+
+    def write(self, data: str | bytes) -> None:
+        self._body.write(data.encode() if isinstance(data, str) else data)
+
+    def start(self, tag: str, attrib: dict[str, str]) -> None:
+        container = _Container(tag, attrib)
+        self._starts.append((self._body.tell(), container))
+        self._open.append(container)
+
+    def end(self, tag: str) -> None:
+        self.write(f"</{tag}>")
+        self._open.pop()
+
+    def add_testcase(self, elem: ET.Element) -> None:
+        self.write(ET.tostring(elem, encoding="utf-8", xml_declaration=False))
+        for container in self._open:
+            container.count(elem)
+        self.testcases += 1
+
+    def close(self) -> None:
+        while self._open:
+            self.end(self._open[-1].tag)
+        self._body.seek(0)
+        with zipfile.ZipFile(self.path, "w", compression=zipfile.ZIP_DEFLATED) as archive:
+            with archive.open(f"{LAUNCH_NAME}.xml", "w", force_zip64=True) as xml:
+                xml.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
+                position = 0
+                for offset, container in self._starts:
+                    xml.write(self._body.read(offset - position))
+                    xml.write(str(container).encode())
+                    position = offset
+                while chunk := self._body.read(CHUNK_SIZE):
+                    xml.write(chunk)
+        self._body.close()
+
+
+def filter_skipped_tests(input_file: str, output_dir: str, max_testcases: int | None = None) -> list[str]:
     """
     Filters out skipped test cases from a JUnit XML file.
 
+    The file is read with iterparse and every test case is written and
+    dropped as soon as it was parsed, so memory use does not depend on the
+    size of the report. The result is written to zip archives, the format
+    the ReportPortal JUnit import accepts. The counters of every testsuites
+    and testsuite element are those of the test cases of its archive.
+
     Args:
         input_file (str): Path to the input JUnit XML file.
+        output_dir (str): Directory to write the archives to.
+        max_testcases (int | None): Maximum number of test cases per archive, None for a single archive.
 
     Returns:
-        ET.Element: The root of the filtered XML tree.
+        list[str]: Paths of the archives, one per launch.
+    """
+    parts = []
+    open_tags = []
+    elems = []
+    part = None
+    for event, elem in ET.iterparse(input_file, events=("start", "end")):
+        if event == "start":
+            elems.append(elem)
+            if elem.tag in CONTAINERS and len(elems) <= 2:
+                open_tags.append((elem.tag, dict(elem.attrib)))
+                if part is not None:
+                    part.start(elem.tag, open_tags[-1][1])
+            continue
+
+        elems.pop()
+        if elem.tag in CONTAINERS and len(elems) < 2:
+            if part is not None:
+                part.end(elem.tag)
+            open_tags.pop()
+            continue
+        if len(elems) != len(open_tags):
+            # Descendant of a test case, written with it
+            continue
+
+        if elem.tag != "testcase" or elem.find("skipped") is None:
+            if part is None or (elem.tag == "testcase" and max_testcases and part.testcases >= max_testcases):
+                if part is not None:
+                    part.close()
+                part = _Part(output_dir, len(parts) + 1, open_tags)
+                parts.append(part)
+            if elem.tag == "testcase":
+                part.add_testcase(elem)
+            else:
+                part.write(ET.tostring(elem, encoding="utf-8", xml_declaration=False))
+        if elems:
+            elems[-1].remove(elem)
+        elem.clear()
+
+    if part is None:
+        part = _Part(output_dir, 1, [])
+        parts.append(part)
+    part.close()
+    return [part.path for part in parts]
+
+
+class _MultipartBody:
     """
-    tree = ET.parse(input_file)
-    root = tree.getroot()
+    A multipart/form-data body read from disk as it is sent.
+    """
+
+    def __init__(self, fields: dict[str, str], file_field: str, filename: str, path: str, mime: str) -> None:
+        self.boundary = secrets.token_hex(16)
+        head = "".join(
+            f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            for name, value in fields.items()
+        )
+        head += (
+            f"--{self.boundary}\r\n"
+            f'Content-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+            f"Content-Type: {mime}\r\n\r\n"
+        )
+        self._head = head.encode()
+        self._tail = f"\r\n--{self.boundary}--\r\n".encode()
+        self._path = path
+        self.len = len(self._head) + os.path.getsize(path) + len(self._tail)
 
-    for testsuite in root.findall("testsuite"):
-        testcases = testsuite.findall("testcase")
-        for testcase in testcases:
-            if testcase.find("skipped") is not None:
-                testsuite.remove(testcase)
+    @property
+    def content_type(self) -> str:
+        return f"multipart/form-data; boundary={self.boundary}"
 
-    return root
+    def __iter__(self):
+        yield self._head
+        with open(self._path, "rb") as body:
+            while chunk := body.read(CHUNK_SIZE):
+                yield chunk
+        yield self._tail
 
 
-def upload_junit_to_rp(filtered_xml: ET.Element) -> None:
+def upload_junit_to_rp(archive: str, launch_name: str = LAUNCH_NAME) -> None:
     """
-    Uploads the filtered JUnit XML content to ReportPortal.
+    Uploads a filtered JUnit archive to ReportPortal as a new launch.
+
+    The archive is streamed from disk, it is never loaded in memory.
 
     Args:
-        filtered_xml (ET.Element): The root of the filtered JUnit XML tree.
+        archive (str): Path of an archive written by filter_skipped_tests.
+        launch_name (str): Name of the launch.
     """
     if not all([RP_API_KEY, RP_ENDPOINT, RP_PROJECT]):
         raise RuntimeError("Missing ReportPortal environment variables.")
     url = f"{RP_ENDPOINT}/api/v1/plugin/{RP_PROJECT}/junit/import"
-    headers = {
-        "accept": "application/json",
-        "Authorization": f"Bearer {RP_API_KEY}",
-    }
 
     launch_import_data = {
         "attributes": [
@@ -53,49 +216,61 @@ def upload_junit_to_rp(filtered_xml: ET.Element) -> None:
         ],
         "description": "Kubernetes E2E testing with kubesan.gitlab.io driver",
         "mode": "DEFAULT",
-        "name": "Kubernetes E2E Testing",
+        "name": launch_name,
     }
 
-    filtered_xml_str = ET.tostring(filtered_xml, encoding="utf-8", method="xml")
-
-    files = {
+    body = _MultipartBody(
+        {"launchImportRq": json.dumps(launch_import_data)},
+        "file",
         # Fallback the filename as the launch name
-        "file": ("Kubernetes E2E Testing.xml", filtered_xml_str, "text/xml"),
+        f"{launch_name}.zip",
+        archive,
+        "application/zip",
+    )
+    headers = {
+        "accept": "application/json",
+        "Authorization": f"Bearer {RP_API_KEY}",
+        "Content-Type": body.content_type,
     }
 
-    response = requests.post(url, headers=headers, files=files, data={"launchImportRq": json.dumps(launch_import_data)})
+    # The body has a len attribute, so requests sends it with a Content-Length instead of chunked
+    response = requests.post(url, headers=headers, data=body)
 
     if response.status_code == 200:
-        print("JUnit result uploaded successfully!")
+        print(f"JUnit result {launch_name} uploaded successfully!")
         result_url = f"{RP_ENDPOINT}/ui/#{RP_PROJECT}/launches/all/{response.json()['data']['id']}"
         print(f"Visit {result_url} to analyze results.")
     else:
         print(f"Failed to upload. Status Code: {response.status_code}, Response: {response.text}")
 
 
-def main(source_file: str) -> None:
+def main(source_file: str, max_testcases: int | None = None) -> None:
     """
     Main function to execute the full workflow:
     1. Filters out skipped test cases from the input JUnit XML file.
-    2. Uploads the filtered XML content to ReportPortal.
-    3. Retrieves and prints the launch URL.
+    2. Uploads the filtered XML content to ReportPortal, one launch per part.
+    3. Retrieves and prints the launch URLs.
 
     Args:
         source_file (str): The path to the source JUnit XML file.
+        max_testcases (int | None): Maximum number of test cases per launch, None for a single launch.
     """
-    # Step 1: Filter out skipped test cases
-    filtered_xml = filter_skipped_tests(source_file)
-    print("Filtered XML created.")
+    with tempfile.TemporaryDirectory(prefix="ksantt-junit-") as tmpdir:
+        # Step 1: Filter out skipped test cases
+        archives = filter_skipped_tests(source_file, tmpdir, max_testcases)
+        print(f"Filtered XML created in {len(archives)} part(s).")
 
-    # Step 2: Upload filtered junit result to ReportPortal
-    upload_junit_to_rp(filtered_xml)
+        # Step 2: Upload filtered junit result to ReportPortal
+        for number, archive in enumerate(archives, start=1):
+            launch_name = LAUNCH_NAME if len(archives) == 1 else f"{LAUNCH_NAME} ({number}/{len(archives)})"
+            upload_junit_to_rp(archive, launch_name)
 
 
 if __name__ == "__main__":
     import sys
 
-    if len(sys.argv) != 2:
-        print("Usage: python script.py <source_file>")
+    if len(sys.argv) not in (2, 3):
+        print("Usage: python script.py <source_file> [max_testcases_per_launch]")
         sys.exit(1)
 
-    main(sys.argv[1])
+    main(sys.argv[1], int(sys.argv[2]) if len(sys.argv) == 3 else None)
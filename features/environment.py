@@ -1,6 +1,7 @@
 import logging
 import os
 from datetime import datetime
+from functools import partial
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
 
@@ -9,15 +10,23 @@ from behave import fixture, use_fixture, use_step_matcher
 from behave.runner import Context
 from behave_reportportal.behave_agent import BehaveAgent, create_rp_service
 from behave_reportportal.config import read_config
-from kubernetes import config
-from kubernetes.dynamic import DynamicClient
 from ocp_resources.namespace import Namespace
 from ocp_resources.storage_class import StorageClass
 from reportportal_client import RPLogger, RPLogHandler
 from simple_logger import logger as sl
 
 import utils
-from utils import rp_attach_plain
+from ocp.golden_image import GoldenImagePool
+from ocp.namespace_pool import NamespacePool, Reaper
+from ocp.tracker import RUN_LABELS, Heartbeat, ResourceTracker, collect_leaks
+from ocp.vm import clear_templates
+from utils import rp_attach
+from utils.client import get_client
+from utils.logship import LogShipper
+from utils.metrics import METRICS
+from utils.rplog import AsyncRPLogHandler
+from utils.runner import RESULT_DIR_ENV
+from utils.watch import Watcher
 
 use_step_matcher("re")
 
@@ -34,9 +43,9 @@ def logger_cleanup():
 @fixture
 def dynamic_client(context: Context):
     """
-    Initialize and configure the Kubernetes dynamic client.
+    Initialize and configure the Kubernetes dynamic client, shared by the whole process.
     """
-    dyn_client = DynamicClient(client=config.new_client_from_config())
+    dyn_client = get_client(context._params)
     context.client = dyn_client
     return dyn_client
 
@@ -78,8 +87,12 @@ def logger(context: Context):
     logging.setLoggerClass(RPLogger)
     logger = logging.getLogger("ksantt")
     logger.setLevel("DEBUG")
-    rph = RPLogHandler(rp_client=context.rp_client)
+    if context.rp_client is not None:
+        rph = AsyncRPLogHandler(rp_client=context.rp_client)
+    else:
+        rph = RPLogHandler(rp_client=context.rp_client)
     logger.addHandler(rph)
+    context.rp_log_handler = rph
     context.logger = logger
     if context.rp_client is not None:
         context.rp_client.verify_ssl = False
@@ -87,22 +100,20 @@ def logger(context: Context):
         context.rp_agent.start_launch(context)
 
 
-@fixture
-def random_namespace(context: Context):
+def new_namespace(context: Context):
     """
     Create a random test namespace for isolation.
     """
     random_suffix = utils.generate_random_string()
     ns_name = f"kubesan-ns-{random_suffix}"
 
-    ns = Namespace(name=ns_name, client=context.client)
+    ns = Namespace(name=ns_name, client=context.client, label=RUN_LABELS)
     ns.create(wait=True)
     ns.logger.info(f"Created namespace '{ns.name}'")
-    context.ns = ns
+    return ns
 
 
-@fixture
-def storage_class(context: Context):
+def new_storage_class(context: Context):
     """
     Create a KubeSAN StorageClass with specified parameters.
     """
@@ -118,6 +129,7 @@ def storage_class(context: Context):
     sc = StorageClass(
         name=sc_name,
         client=context.client,
+        label=RUN_LABELS,
         provisioner=context._params["sc"]["provisioner"],
         reclaim_policy=StorageClass.ReclaimPolicy.DELETE,
         volume_binding_mode=StorageClass.VolumeBindingMode.Immediate,
@@ -126,16 +138,81 @@ def storage_class(context: Context):
     )
     sc.create(wait=True)
     sc.logger.info(f"StorageClass '{sc.name}' created")
-    context.sc = sc
+    return sc
+
+
+@fixture
+def random_namespace(context: Context):
+    """
+    Create a random test namespace for isolation.
+    """
+    context.ns = new_namespace(context)
+
+
+@fixture
+def storage_class(context: Context):
+    """
+    Create a KubeSAN StorageClass with specified parameters.
+    """
+    context.sc = new_storage_class(context)
+
+
+@fixture
+def namespace_pool(context: Context):
+    """
+    Keep namespaces and StorageClasses across features when pooling is enabled.
+    """
+    context.reaper = Reaper()
+    context.ns_pool = None
+    if str(context._params["pool"]["enabled"]).lower() == "true":
+        context.ns_pool = NamespacePool(
+            context.client,
+            lambda: new_namespace(context),
+            lambda: new_storage_class(context),
+            context.reaper,
+            size=int(context._params["pool"]["size"]),
+        )
+
+
+def teardown_feature(golden_images, sc, ns):
+    """
+    Delete the namespace and StorageClass of a feature.
+    """
+    golden_images.release(sc.name)
+    sc.delete(wait=True)
+    ns.delete(wait=True)
 
 
 @fixture
 def result_location(context: Context):
-    timestamp = datetime.now().isoformat()
-    job_name = f"ksantt-{timestamp}"
-    result_dir = Path(__file__).parent.parent / "results" / job_name
+    """
+    Create the result directory, or use the one given by the parallel runner.
+    """
+    if os.getenv(RESULT_DIR_ENV):
+        result_dir = Path(os.environ[RESULT_DIR_ENV])
+    else:
+        timestamp = datetime.now().isoformat()
+        job_name = f"ksantt-{timestamp}"
+        result_dir = Path(__file__).parent.parent / "results" / job_name
     result_dir.mkdir(mode=0o755, parents=True, exist_ok=True)
     context.result_dir = result_dir
+    METRICS.open(result_dir / "metrics.jsonl")
+
+
+def ship_log(context: Context, item_id, name, data, start, end):
+    """
+    Upload a chunk of the ocp_resources log file to the scenario.
+
+    Chunks are shipped from a thread and do not follow step boundaries, the
+    index of the log maps their byte ranges to steps.
+    """
+    rp_attach(
+        partial(context.logger.debug, extra={"rp_item_id": item_id}),
+        f"ocp_resources log bytes {start}-{end}",
+        name,
+        data,
+        "application/gzip",
+    )
 
 
 def before_all(context: Context):
@@ -146,12 +223,25 @@ def before_all(context: Context):
     use_fixture(logger, context)
     use_fixture(load_parameters, context)
     use_fixture(dynamic_client, context)
+    collect_leaks(context.client, int(context._params["gc"]["leak_age"]), context.logger)
+    context.heartbeat = Heartbeat(context.client, int(context._params["gc"]["heartbeat"])).start()
+    context.golden_images = GoldenImagePool(context.client)
+    use_fixture(namespace_pool, context)
 
 
 def after_all(context: Context):
     """
     Clean up global test environment after all tests complete.
     """
+    for error in context.reaper.join():
+        context.logger.error(f"Feature teardown failed: {error}")
+    context.golden_images.close()
+    if context.ns_pool is not None:
+        context.ns_pool.close()
+    context.heartbeat.stop()
+    Watcher.for_client(context.client).stop()
+    METRICS.close()
+    context.rp_log_handler.flush()
     if context.rp_client is not None:
         context.rp_agent.finish_launch(context)
         context.rp_client.terminate()
@@ -165,16 +255,32 @@ def before_feature(context: Context, feature):
     context.feature_dir.mkdir(mode=0o755)
     if context.rp_client is not None:
         context.rp_agent.start_feature(context, feature)
-    use_fixture(random_namespace, context)
-    use_fixture(storage_class, context)
+    if context.ns_pool is not None:
+        context.ns, context.sc = context.ns_pool.acquire()
+    else:
+        use_fixture(random_namespace, context)
+        use_fixture(storage_class, context)
+        golden_image = str(context._params["vm"]["golden_image"]).lower() == "true" or any(
+            "golden_image" in scenario.effective_tags for scenario in feature.walk_scenarios()
+        )
+        if golden_image:
+            # Golden images are kept per StorageClass, which only outlives the feature in the pool
+            context.logger.warning(
+                f"Feature '{feature.name}' uses golden images without pool.enabled, "
+                f"the image is imported again for the StorageClass of the feature"
+            )
 
 
 def after_feature(context: Context, feature):
     """
     Clean up environment after each feature completes.
     """
-    context.sc.delete(wait=True)
-    context.ns.delete(wait=True)
+    Watcher.for_client(context.client).stop(namespace=context.ns.name)
+    clear_templates()
+    if context.ns_pool is not None:
+        context.ns_pool.release((context.ns, context.sc))
+    else:
+        teardown_feature(context.golden_images, context.sc, context.ns)
     if context.rp_client is not None:
         context.rp_agent.finish_feature(context, feature)
 
@@ -188,23 +294,38 @@ def before_scenario(context: Context, scenario):
     context.scenario_dir.mkdir(mode=0o755)
     os.environ["OPENSHIFT_PYTHON_WRAPPER_LOG_FILE"] = str(context.scenario_dir / "ocp_resources.log")
     context.params = context._params.copy()
+    context.tracker = ResourceTracker()
+    METRICS.labels["scenario"] = str(context.scenario_dir.relative_to(context.result_dir))
     if context.rp_client is not None:
         context.rp_agent.start_scenario(context, scenario)
+    logs = context.params["logs"]
+    context.log_shipper = LogShipper(
+        context.scenario_dir / "ocp_resources.log",
+        send=partial(ship_log, context, context.rp_client.current_item()) if context.rp_client is not None else None,
+        chunk_size=int(logs["chunk_size"]),
+        max_size=int(logs["max_size"]),
+        tail_size=int(logs["tail_size"]),
+        interval=int(logs["interval"]),
+    )
 
 
 def after_scenario(context: Context, scenario):
     """
     Clean up environment after each scenario completes.
     """
+    for vm in getattr(context, "vms", []):
+        vm.ssh_pool.close()
+        vm.close_console()
     del context.params
+    METRICS.labels.pop("scenario", None)
     logger_cleanup()
-    if context.rp_client is not None:
-        rp_attach_plain(
-            context.logger.debug,
-            "Upload ocp_resources log file",
-            "ocp_resources.log",
-            (context.scenario_dir / "ocp_resources.log").read_text(),
+    index = context.log_shipper.close()
+    for skipped in index["skipped"] + index["failed"]:
+        context.logger.warning(
+            f"ocp_resources log bytes {skipped['start']}-{skipped['end']} not uploaded, "
+            f"see {context.scenario_dir / 'ocp_resources.log'}"
         )
+    if context.rp_client is not None:
         context.rp_agent.finish_scenario(context, scenario)
 
 
@@ -214,11 +335,15 @@ def before_step(context: Context, step):
     """
     if context.rp_client is not None:
         context.rp_agent.start_step(context, step)
+    context.log_shipper.begin_step(f"{step.keyword} {step.name}")
+    context.step_timer = METRICS.begin()
 
 
 def after_step(context: Context, step):
     """
     Clean up environment after each step completes.
     """
+    METRICS.end(context.step_timer, "step", f"{step.keyword} {step.name}", step.status.name)
+    context.log_shipper.end_step(step.status.name)
     if context.rp_client is not None:
         context.rp_agent.finish_step(context, step)
@@ -16,3 +16,15 @@ Feature: Multiple VMs with multiple volumes
         And  I can access the VMs
         When I perform a deletion of the VMs
         Then the VMs should be completely removed
+
+    Scenario: Apply VMs, PVCs and DVs in bulk
+        Given 2 PVCs
+        And   2 DVs
+        When  I apply the defined resources
+        Then  the PVCs status should change to Bound
+        And   the DVs status should change to Succeeded
+        And   the VMs status should change to Running
+        When  I perform a deletion of the defined resources
+        Then  the VMs should be completely removed
+        And   the PVCs should be completely removed
+        And   the DVs should be completely removed
@@ -0,0 +1,9 @@
+@vm @scale @golden_image
+Feature: Scale
+    As a KubeSAN developer,
+    I want to create more and more VMs with volumes at the same time,
+    So that I can find the load from which volume provisioning slows down.
+
+    Scenario: Ramp up VMs with PVCs
+        When I ramp up VMs with PVCs in waves
+        Then every wave of the ramp should succeed
@@ -1,12 +1,13 @@
 from itertools import zip_longest
 
 from behave import given, then, when
-from ocp_resources.datavolume import DataVolume
 from ocp_resources.pod import Pod
-from timeout_sampler import TimeoutExpiredError
+from ocp_resources.utils.constants import TIMEOUT_2MINUTES
 
 import utils
+from ocp.datavolume import DataVolume
 from utils.exceptions import BehaveScenarioError
+from utils.provisioning import Provisioning
 
 
 class DVSteps:
@@ -36,6 +37,7 @@ class DVSteps:
                 **dv_params,
             )
             dv.to_dict()
+            context.tracker.register(dv)
             context.dvs.append(dv)
             utils.rp_attach_json(
                 context.logger.info,
@@ -47,57 +49,67 @@ class DVSteps:
     @when(r"I create the DV(?:s)?")
     def create_dvs(context):
         """
-        Create DataVolume(s) from the defined objects.
+        Create DataVolume(s) from the defined objects, concurrently.
         """
-        for dv in context.dvs:
-            dv.create()
+        context.dv_provisioning = Provisioning(context.dvs, DataVolume.Status.SUCCEEDED)
+        context.dv_provisioning.create(context)
 
     @then(r"the DV(?:s)? status should change to Succeeded")
     def dvs_should_be_succeeded(context):
         """
-        Monitor the DataVolume(s) status and wait for it to reach the Succeeded state.
+        Monitor the DataVolume(s) status and wait for all of them to reach the Succeeded state.
+
+        The import latency of every DataVolume is appended to provisioning.jsonl in the scenario directory.
 
         Raises:
             BehaveStepError: If the DataVolume fails to reach 'Succeeded' status within timeout
         """
-        for dv in context.dvs:
-            try:
-                dv.wait_for_dv_success()
-                context.logger.info(f"DataVolume {dv.name} is ready")
-            except TimeoutExpiredError:
-                expected_skipped = False
-                prime_pvc = dv.pvc.prime_pvc
-                importer = Pod(
-                    name=prime_pvc.instance.metadata.annotations["cdi.kubevirt.io/storage.import.importPodName"],
-                    namespace=context.ns.name,
-                )
-                event_messages = []
-                for event in importer.events(timeout=3):
-                    event = event["object"]
-                    message = event.message
-                    if "Filesystem volumes only support single-node access modes" in message:
-                        expected_skipped = True
-                    event_messages.append(message)
+        provisioning = context.dv_provisioning
+        # Like DataVolume.wait_for_dv_success, give up early on DataVolumes which do not even start
+        provisioning.wait(timeout=int(context.params["dv"]["succeeded_timeout"]), started_timeout=TIMEOUT_2MINUTES)
+        record = provisioning.record(context.scenario_dir / "provisioning.jsonl")
+        context.logger.info(
+            f"{len(record['latencies'])}/{record['count']} DataVolume(s) succeeded, "
+            f"latency median {record['latency'].get('median')}s p95 {record['latency'].get('p95')}s"
+        )
+        utils.rp_attach_json(context.logger.info, "DataVolume provisioning", "provisioning.json", record)
 
-                context.logger.error(f"DataVolume is in {dv.status} phase")
-                utils.rp_attach_plain(
-                    context.logger.debug,
-                    f"{dv.name} importer events",
-                    f"{dv.name}_events.txt",
-                    "\n".join(event_messages),
-                )
-                if not expected_skipped:
-                    raise BehaveScenarioError(context.scenario.name, "Wait until DataVolume succeeded")
-                context.scenario.skip(f'DataVolume using not supported accessModes "{dv.access_modes}"')
+        failed = provisioning.failed()
+        for dv in failed:
+            expected_skipped = False
+            prime_pvc = dv.pvc.prime_pvc
+            importer = Pod(
+                name=prime_pvc.instance.metadata.annotations["cdi.kubevirt.io/storage.import.importPodName"],
+                namespace=context.ns.name,
+                client=context.client,
+            )
+            event_messages = []
+            for event in importer.events(timeout=3):
+                event = event["object"]
+                message = event.message
+                if "Filesystem volumes only support single-node access modes" in message:
+                    expected_skipped = True
+                event_messages.append(message)
+
+            context.logger.error(f"DataVolume is in {dv.status} phase")
+            utils.rp_attach_plain(
+                context.logger.debug,
+                f"{dv.name} importer events",
+                f"{dv.name}_events.txt",
+                "\n".join(event_messages),
+            )
+            if not expected_skipped:
+                raise BehaveScenarioError(context.scenario.name, f"Wait until DataVolume {dv.name} succeeded")
+        if failed:
+            context.scenario.skip(f'DataVolume using not supported accessModes "{failed[0].access_modes}"')
 
     @when(r"I perform a deletion of the DV(?:s)?")
     def delete_dvs(context):
         """
         Remove the DataVolume(s) from the cluster and ensure deletion is finished.
         """
-        for dv in context.dvs:
-            dv.delete(wait=True)
-            context.logger.info(f"DataVolume {dv.name} is deleted")
+        context.tracker.delete(context.dvs)
+        context.logger.info(f"DataVolume(s) {', '.join(dv.name for dv in context.dvs)} are deleted")
 
     @then(r"the DV(?:s)? should be completely removed")
     def dvs_should_not_exist(context):
@@ -110,4 +122,4 @@ class DVSteps:
         for dv in context.dvs:
             assert not dv.exists, f"DataVolume '{dv.name}' still exists after deletion."
             context.logger.info(f'DataVolume "{dv.name}" no longer exists')
-            context.dvs.remove(dv)
+        context.dvs.clear()
@@ -1,7 +1,7 @@
 from behave import given
-from ocp_resources.datavolume import DataVolume
 
 import utils
+from ocp.datavolume import DataVolume
 
 
 @given(r"a DV with access mode (?P<access_modes>.+) and volume mode (?P<volume_mode>.+)")
@@ -10,7 +10,7 @@ def define_dv(context, access_modes, volume_mode):
     Define a new DataVolume with the given configuration parameters.
 
     """
-    sc_mode = context.sc.instance.parameters.mode
+    sc_mode = context.params["sc"]["mode"]
     dv_name = f"dv-{sc_mode.lower()}-{volume_mode.lower()}-{access_modes.lower()}"
     url = context.params["dv"]["url"]
     size = context.params["dv"]["size"]
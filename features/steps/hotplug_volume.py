@@ -4,64 +4,73 @@ from behave import then, when
 from timeout_sampler import TimeoutSampler
 
 from utils import storage
+from utils.concurrency import run_concurrently
+
+
+def wait_for_console_logins(context):
+    """
+    Wait for every VM to be logged in on its console, all at once.
+
+    The waits are cheap, the consoles are driven by a single thread, so there
+    is one worker per VM instead of concurrency.max_workers.
+    """
+    run_concurrently(context, lambda vm: vm.wait_for_console_login(), context.vms, workers=len(context.vms))
 
 
 @when(r"I hotplug (?P<count>\d+) (?P<volume_type>PVC|DV)(?:s)? to the running VM(?:s)?")
 def hotplug_volume(context, count, volume_type):
     volume_type = f"{volume_type.lower()}s"
     context.hotplugged_volumes = []
+    wait_for_console_logins(context)
     for vm in context.vms:
-        vm.wait_for_console_login()
-        session = vm.wait_for_ssh_login()
-        disks = storage.get_disks(vm, session)
-        for _ in range(int(count)):
-            volume = getattr(context, volume_type).pop()
+        disks = storage.get_disks(vm)
+        volumes = [getattr(context, volume_type).pop() for _ in range(int(count))]
+        for volume in volumes:
             vm.hotplug_volume(volume)
+        for volume in volumes:
+            vm.wait_for_volume_status(volume)
 
         for new_disks in TimeoutSampler(
             wait_timeout=60,
-            sleep=5,
+            sleep=1,
             func=storage.get_disks,
             vm=vm,
-            session=session,
         ):
             if len(new_disks) == (int(count) + len(disks)):
                 vm.logger.info(f"Expected {len(new_disks)} disks")
                 context.hotplugged_volumes.append(new_disks - disks)
                 break
-        session.close()
 
 
 @when(r"I hotunplug (?P<count>\d+) (?P<volume_type>PVC|DV)(?:s)? from the running VM(?:s)?")
 def hotunplug_volume(context, count, volume_type):
     volume_type = f"{volume_type.lower()}s"
     context.hotplugged_volumes = []
+    wait_for_console_logins(context)
     for vm in context.vms:
-        vm.wait_for_console_login()
-        session = vm.wait_for_ssh_login()
-        disks = storage.get_disks(vm, session)
-        for _ in range(int(count)):
-            volume = getattr(context, volume_type).pop()
+        disks = storage.get_disks(vm)
+        volumes = [getattr(context, volume_type).pop() for _ in range(int(count))]
+        for volume in volumes:
             vm.hotunplug_volume(volume)
+        for volume in volumes:
+            vm.wait_for_volume_status(volume, ready=False)
 
         for new_disks in TimeoutSampler(
             wait_timeout=60,
-            sleep=5,
+            sleep=1,
             func=storage.get_disks,
             vm=vm,
-            session=session,
         ):
-            if len(new_disks) == (int(count) + len(disks)):
+            if len(new_disks) == (len(disks) - int(count)):
                 vm.logger.info(f"Expected {len(new_disks)} disks")
-                context.hotplugged_volumes.append(new_disks - disks)
+                context.hotplugged_volumes.append(disks - new_disks)
                 break
-        session.close()
 
 
 @then(r"the VM(?:s)? should be able to access the new (?:PVC|DV)(?:s)?")
 def check_disks_access(context):
     for vm, disks in zip_longest(context.vms, context.hotplugged_volumes, fillvalue=set()):
-        session = vm.wait_for_ssh_login()
-        for disk in disks:
-            vm.cmd(f"dd if=/dev/{disk} of=/dev/null bs=1M count=10", session)
-        session.close()
+        disks = sorted(disks)
+        results = vm.cmd_batch([f"dd if=/dev/{disk} of=/dev/null bs=1M count=10" for disk in disks])
+        for disk, result in zip(disks, results):
+            assert result and result.rc == 0, f"{vm.name} failed to read /dev/{disk}: {result}"
@@ -1,10 +1,11 @@
 from itertools import zip_longest
 
 from behave import given, then, when
-from ocp_resources.persistent_volume_claim import PersistentVolumeClaim
 from timeout_sampler import TimeoutExpiredError
 
 import utils
+from ocp.persistent_volume_claim import PersistentVolumeClaim
+from utils.provisioning import Provisioning
 
 
 class PVCSteps:
@@ -31,6 +32,7 @@ class PVCSteps:
                 **pvc_params,
             )
             pvc.to_dict()
+            context.tracker.register(pvc)
             context.pvcs.append(pvc)
             utils.rp_attach_json(
                 context.logger.info,
@@ -42,31 +44,47 @@ class PVCSteps:
     @when(r"I create the PVC(?:s)?")
     def create_pvcs(context):
         """
-        Create PersistentVolumeClaim(s) from the defined objects.
+        Create PersistentVolumeClaim(s) from the defined objects, concurrently.
         """
-        for pvc in context.pvcs:
-            pvc.create()
+        context.pvc_provisioning = Provisioning(
+            context.pvcs,
+            PersistentVolumeClaim.Status.BOUND,
+            final_states=(PersistentVolumeClaim.Status.BOUND, PersistentVolumeClaim.Status.LOST),
+        )
+        context.pvc_provisioning.create(context)
 
     @then(r"the PVC(?:s)? status should change to Bound")
     def pvc_should_be_bound(context):
         """
-        Monitor the PersistentVolumeClaim(s) status and wait for it to reach the Bound state.
+        Monitor the PersistentVolumeClaim(s) status and wait for all of them to reach the Bound state.
+
+        The provisioning latency of every claim is appended to provisioning.jsonl in the scenario directory.
 
         Raises:
-            TimeoutExpiredError: If the PVC fails to reach 'Bound' status within timeout
+            TimeoutExpiredError: If any PVC fails to reach 'Bound' status within timeout
         """
-        for pvc in context.pvcs:
-            try:
-                pvc.wait_for_status(PersistentVolumeClaim.Status.BOUND, timeout=60)
-                context.logger.info(f"PersistentVolumeClaim {pvc.name} is bound")
-            except TimeoutExpiredError:
-                utils.rp_attach_json(
-                    context.logger.debug,
-                    f"PersistentVolumeClaim is in {pvc.status} status",
-                    f"{pvc.name}_instance.json",
-                    pvc.instance.to_dict(),
-                )
-                raise
+        provisioning = context.pvc_provisioning
+        stragglers = provisioning.wait(timeout=int(context.params["pvc"]["bound_timeout"]))
+        record = provisioning.record(context.scenario_dir / "provisioning.jsonl")
+        context.logger.info(
+            f"{len(record['latencies'])}/{record['count']} PersistentVolumeClaim(s) bound, "
+            f"latency median {record['latency'].get('median')}s p95 {record['latency'].get('p95')}s"
+        )
+        utils.rp_attach_json(context.logger.info, "PersistentVolumeClaim provisioning", "provisioning.json", record)
+
+        failed = provisioning.failed()
+        for pvc in failed:
+            utils.rp_attach_json(
+                context.logger.debug,
+                f"PersistentVolumeClaim {pvc.name} is in {pvc.status} status",
+                f"{pvc.name}_instance.json",
+                pvc.instance.to_dict(),
+            )
+        if failed:
+            raise TimeoutExpiredError(
+                f"PersistentVolumeClaim(s) not Bound: {', '.join(pvc.name for pvc in failed)}, "
+                f"stragglers: {', '.join(pvc.name for pvc in stragglers) or 'none'}"
+            )
 
     @when(r"I perform a deletion of the PVC(?:s)?")
     def delete_pvcs(context):
@@ -76,9 +94,8 @@ class PVCSteps:
         Args:
             context: Behave context containing the PVC to delete
         """
-        for pvc in context.pvcs:
-            pvc.delete(wait=True)
-            context.logger.info(f"PersistentVolumeClaim {pvc.name} is deleted")
+        context.tracker.delete(context.pvcs)
+        context.logger.info(f"PersistentVolumeClaim(s) {', '.join(pvc.name for pvc in context.pvcs)} are deleted")
 
     @then(r"the PVC(?:s)? should be completely removed")
     def pvcs_should_not_exist(context):
@@ -91,4 +108,4 @@ class PVCSteps:
         for pvc in context.pvcs:
             assert not pvc.exists, f"PersistentVolumeClaim '{pvc.name}' still exists after deletion."
             context.logger.info(f"PersistentVolumeClaim '{pvc.name}' no longer exists")
-            context.pvcs.remove(pvc)
+        context.pvcs.clear()
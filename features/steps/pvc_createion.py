@@ -1,6 +1,6 @@
 from behave import given
-from ocp_resources.persistent_volume_claim import PersistentVolumeClaim
 
+from ocp.persistent_volume_claim import PersistentVolumeClaim
 from utils import rp_attach_json
 
 
@@ -9,7 +9,7 @@ def define_pvcs(context, access_modes, volume_mode):
     """
     Define a new PersistentVolumeClaim with the given configuration parameters.
     """
-    sc_mode = context.sc.instance.parameters.mode
+    sc_mode = context.params["sc"]["mode"]
     name = f"pvc-{sc_mode.lower()}-{volume_mode.lower()}-{access_modes.lower()}"
     size = context.params["pvc"]["size"]
 
@@ -0,0 +1,55 @@
+from behave import when
+
+from ocp.datavolume import DataVolume
+from ocp.persistent_volume_claim import PersistentVolumeClaim
+from utils.provisioning import Provisioning
+
+
+def defined_resources(context):
+    """
+    Get the DataVolumes, PersistentVolumeClaims and VirtualMachines defined by the steps, in that order.
+    """
+    return [*getattr(context, "dvs", []), *getattr(context, "pvcs", []), *getattr(context, "vms", [])]
+
+
+class ResourceSteps:
+    @when(r"I apply the defined resources")
+    def apply_resources(context):
+        """
+        Create every defined DV, PVC and VM with server-side apply, all in one bounded pool.
+
+        DVs and PVCs are timed as by the create steps, so the Succeeded and
+        Bound steps follow as usual.
+        """
+        context.dv_provisioning = Provisioning(getattr(context, "dvs", []), DataVolume.Status.SUCCEEDED)
+        context.pvc_provisioning = Provisioning(
+            getattr(context, "pvcs", []),
+            PersistentVolumeClaim.Status.BOUND,
+            final_states=(PersistentVolumeClaim.Status.BOUND, PersistentVolumeClaim.Status.LOST),
+        )
+        provisionings = {DataVolume.kind: context.dv_provisioning, PersistentVolumeClaim.kind: context.pvc_provisioning}
+
+        def track(obj):
+            if obj.kind in provisionings:
+                provisionings[obj.kind].track(obj)
+
+        for provisioning in provisionings.values():
+            provisioning.start()
+        try:
+            context.tracker.apply(context, defined_resources(context), before=track)
+        except Exception:
+            for provisioning in provisionings.values():
+                provisioning.close()
+            raise
+
+    @when(r"I perform a deletion of the defined resources")
+    def delete_resources(context):
+        """
+        Remove every defined DV, PVC and VM with one deletecollection per kind, and wait for all of them.
+        """
+        for vm in getattr(context, "vms", []):
+            vm.ssh_pool.close()
+            vm.close_console()
+        objs = defined_resources(context)
+        context.tracker.delete(objs)
+        context.logger.info(f"{len(objs)} defined resource(s) are deleted")
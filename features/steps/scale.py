@@ -0,0 +1,153 @@
+import json
+import time
+
+from behave import then, when
+
+import utils
+from utils.exceptions import BehaveScenarioError
+from utils.metrics import METRICS
+from utils.scale import ScaleRamp, parse_waves
+from utils.watch import StateTimer, Watcher
+
+# Reasons of the Warning events counted as storage driver errors
+DRIVER_REASONS = ("ProvisioningFailed", "FailedAttachVolume", "FailedMount", "VolumeResizeFailed")
+
+
+def driver_warnings(context):
+    """
+    Get the uids of the Warning events of the storage driver in the namespace.
+    """
+    events = context.client.resources.get(api_version="v1", kind="Event")
+    provisioner = context.params["sc"]["provisioner"]
+    uids = set()
+    for event in events.get(namespace=context.ns.name, field_selector="type=Warning").items:
+        source = event.reportingController or (event.source.component if event.source else None) or ""
+        if event.reason in DRIVER_REASONS or provisioner in source:
+            uids.add(event.metadata.uid)
+    return uids
+
+
+def run_wave(context, wave, timers, volumes_per_vm):
+    """
+    Create the VMs and PVCs of a wave with the VM and PVC steps, time them, then delete them.
+
+    Root disk PVCs and hotplugged PVCs are timed to Bound, root disk
+    DataVolumes to Succeeded and VMs to Running, from the start of the wave.
+    """
+    context.execute_steps(f"Given {wave.volumes} PVCs\nAnd {wave.vms} VMs")
+    vms, pvcs = list(context.vms), list(context.pvcs)
+    names = {
+        "bound": [pvc.name for pvc in pvcs] + [vm.dv.name for vm in vms],
+        "succeeded": [vm.dv.name for vm in vms],
+        "running": [vm.name for vm in vms],
+    }
+    watcher = Watcher.for_client(context.client)
+    watches = {
+        "bound": watcher.watch(vms[0].dv.pvc),
+        "succeeded": watcher.watch(vms[0].dv),
+        "running": watcher.watch(vms[0]),
+    }
+    start = time.time()
+    for milestone, timer in timers.items():
+        timer.track(names[milestone], start)
+        watches[milestone].add_listener(timer)
+    api_calls, api_errors = METRICS.api_counters()
+    warnings = driver_warnings(context)
+    failed = True
+    try:
+        context.execute_steps(
+            """
+            When I create the VMs
+            And  I create the PVCs
+            Then the PVCs status should change to Bound
+            And  the VMs status should change to Running
+            """
+        )
+        if volumes_per_vm:
+            context.execute_steps(f"When I hotplug {volumes_per_vm} PVCs to the running VMs")
+        failed = False
+    finally:
+        # A failing measurement or cleanup is logged, so it does not replace the error that ended the wave
+        try:
+            for milestone, timer in timers.items():
+                watches[milestone].remove_listener(timer)
+                wave.latencies[milestone] = timer.durations(names[milestone])
+            calls, errors = METRICS.api_counters()
+            wave.api_calls, wave.api_errors = calls - api_calls, errors - api_errors
+            wave.driver_errors = len(driver_warnings(context) - warnings)
+        except Exception as exc:
+            context.logger.error(f"Failed to measure wave {wave.number}: {exc}")
+        try:
+            # Hotplug takes the PVCs off context.pvcs, delete all of them
+            context.vms, context.pvcs = vms, pvcs
+            context.execute_steps(
+                """
+                When I perform a deletion of the VMs
+                Then the VMs should be completely removed
+                When I perform a deletion of the PVCs
+                Then the PVCs should be completely removed
+                """
+            )
+        except Exception as exc:
+            if failed:
+                context.logger.error(f"Failed to clean up wave {wave.number}: {exc}")
+            else:
+                raise
+
+
+class ScaleSteps:
+    @when(r"I ramp up VMs with PVCs in waves")
+    def ramp_up(context):
+        """
+        Create more and more VMs with PVCs, one wave after another.
+
+        Wave sizes, PVCs per VM and the knee factor are configured under
+        scale in configs.yaml. The ramp stops at the first failed wave. Every
+        wave is appended to scale.jsonl in the scenario directory.
+        """
+        scale_params = context.params["scale"]
+        volumes_per_vm = int(scale_params["volumes"])
+        timers = {
+            "bound": StateTimer("Bound", lambda obj: obj.status.phase),
+            "succeeded": StateTimer("Succeeded", lambda obj: obj.status.phase),
+            "running": StateTimer("Running", lambda obj: obj.status.printableStatus),
+        }
+        ramp = ScaleRamp(
+            parse_waves(scale_params["waves"]),
+            volumes_per_vm,
+            lambda wave: run_wave(context, wave, timers, volumes_per_vm),
+            knee_factor=float(scale_params["knee_factor"]),
+        )
+        context.scale_waves = ramp.run()
+
+        with open(context.scenario_dir / "scale.jsonl", "a") as result_file:
+            for wave in context.scale_waves:
+                result_file.write(json.dumps(wave.to_dict()) + "\n")
+        for wave in context.scale_waves:
+            context.logger.info(
+                f"Wave {wave.number}: {wave.vms} VMs, {wave.volumes} PVCs in {wave.wall_time:.1f}s, "
+                f"p95 Bound {wave.p95('bound')}s Succeeded {wave.p95('succeeded')}s Running {wave.p95('running')}s, "
+                f"{wave.api_errors}/{wave.api_calls} API errors, {wave.driver_errors} driver errors"
+            )
+        knees = ramp.knees()
+        context.logger.info(f"Latency knee in VMs per wave: {knees}")
+        utils.rp_attach_json(
+            context.logger.info,
+            "Scale ramp",
+            "scale.json",
+            {"knees": knees, "waves": [wave.to_dict() for wave in context.scale_waves]},
+        )
+
+    @then(r"every wave of the ramp should succeed")
+    def waves_should_succeed(context):
+        """
+        Verify that the ramp got through every wave.
+
+        Raises:
+            BehaveScenarioError: If a wave failed
+        """
+        for wave in context.scale_waves:
+            if wave.error:
+                raise BehaveScenarioError(
+                    context.scenario.name, f"Wave {wave.number} of {wave.vms} VMs failed: {wave.error}"
+                )
@@ -0,0 +1,79 @@
+import json
+from itertools import zip_longest
+
+from behave import when
+
+import utils
+from utils.exceptions import BehaveScenarioError
+from utils.fio import fio_command, parse_fio_result
+
+NO_PACKAGE_MANAGER = "no-package-manager"
+# Install fio with the package manager of the guest, print NO_PACKAGE_MANAGER when there is none
+FIO_INSTALL = (
+    "if command -v fio >/dev/null; then :; "
+    "elif command -v dnf >/dev/null; then sudo dnf install -y -q fio; "
+    "elif command -v yum >/dev/null; then sudo yum install -y -q fio; "
+    "elif command -v apt-get >/dev/null; then sudo apt-get update -qq && sudo apt-get install -y -qq fio; "
+    "elif command -v zypper >/dev/null; then sudo zypper -n -q install fio; "
+    "elif command -v apk >/dev/null; then sudo apk add -q fio; "
+    f"else echo {NO_PACKAGE_MANAGER}; exit 1; fi"
+)
+
+
+@when(r"I run the fio (?P<profiles>.+) benchmark(?:s)? on the new (?:PVC|DV)(?:s)?")
+def run_fio_benchmarks(context, profiles):
+    """
+    Run fio profiles against every hotplugged disk of the VM(s).
+
+    Profiles are defined under fio.profiles in configs.yaml, "all" runs every
+    one of them. The raw fio output is kept under fio/ in the scenario
+    directory and a summary per run is appended to benchmark.jsonl.
+
+    fio is installed with the package manager of the guest when it is
+    missing, the scenario is skipped if the guest has none.
+
+    Raises:
+        BehaveScenarioError: If fio cannot be installed or a fio run fails
+    """
+    fio_params = context.params["fio"]
+    if profiles.strip() == "all":
+        profiles = list(fio_params["profiles"])
+    else:
+        profiles = [profile.strip() for profile in profiles.split(",")]
+    fio_dir = context.scenario_dir / "fio"
+    fio_dir.mkdir(mode=0o755, exist_ok=True)
+
+    for vm, disks in zip_longest(context.vms, context.hotplugged_volumes, fillvalue=set()):
+        return_code, stdout, stderr = vm.cmd(FIO_INSTALL)
+        if return_code and NO_PACKAGE_MANAGER in stdout:
+            context.scenario.skip(f"fio is not installed on {vm.name} and no supported package manager was found")
+            return
+        if return_code:
+            raise BehaveScenarioError(context.scenario.name, f"Failed to install fio on {vm.name}: {stderr}")
+
+        for disk in sorted(disks):
+            for profile in profiles:
+                command = fio_command(
+                    name=profile,
+                    filename=f"/dev/{disk}",
+                    runtime=fio_params["runtime"],
+                    size=fio_params["size"],
+                    ioengine=fio_params["ioengine"],
+                    **fio_params["profiles"][profile],
+                )
+                return_code, stdout, stderr = vm.cmd(f"sudo {command}")
+                if return_code:
+                    raise BehaveScenarioError(
+                        context.scenario.name, f"fio {profile} failed on {vm.name} /dev/{disk}: {stderr}"
+                    )
+                (fio_dir / f"{vm.name}-{disk}-{profile}.json").write_text(stdout)
+
+                result = {"vm": vm.name, "disk": disk, "profile": profile, **parse_fio_result(stdout)}
+                with open(context.scenario_dir / "benchmark.jsonl", "a") as result_file:
+                    result_file.write(json.dumps(result) + "\n")
+                utils.rp_attach_json(
+                    context.logger.info,
+                    f"fio {profile} on {vm.name} /dev/{disk}",
+                    f"{vm.name}-{disk}-{profile}.json",
+                    result,
+                )
@@ -1,10 +1,12 @@
+import json
 from itertools import zip_longest
 
 from behave import given, then, when
 from timeout_sampler import TimeoutExpiredError
 
 import utils
-from ocp.vm import VM
+from ocp.vm import TEMPLATE_NAME, VM, stamp
+from utils.concurrency import run_concurrently
 
 
 class VMSteps:
@@ -26,28 +28,49 @@ class VMSteps:
             "username": context.params["vm"]["username"],
             "password": context.params["vm"]["password"],
         }
+        golden_image = str(context.params["vm"]["golden_image"]).lower() == "true" or "golden_image" in context.tags
         for _, extra_params in zip_longest(range(int(count)), table, fillvalue={}):
             name = f"vm-{utils.generate_random_string(8)}"
             vm_params.update(extra_params.items())
+            disk_params = {}
+            if golden_image:
+                golden = context.golden_images.get(
+                    vm_params["url"],
+                    context.sc.name,
+                    vm_params["size"],
+                    source=vm_params["source"],
+                    access_modes=vm_params["access_modes"],
+                    volume_mode=vm_params["volume_mode"],
+                )
+                disk_params = {"source": "pvc", "source_pvc": golden.name, "source_namespace": golden.namespace}
             vm = VM(
                 name=name,
                 namespace=context.ns.name,
                 client=context.client,
                 storage_class=context.sc.name,
                 inject_cloud_init=True,
-                **vm_params,
+                **{**vm_params, **disk_params},
             )
             vm.to_dict()
+            context.tracker.register(vm)
             context.vms.append(vm)
-            utils.rp_attach_json(context.logger.info, f"Defined {vm.name} with manifest", f"{vm.name}.json", vm.res)
+            if vm.template.name == vm.name:
+                utils.rp_attach_json(context.logger.info, f"Defined {vm.name} with manifest", f"{vm.name}.json", vm.res)
+            else:
+                # Only log how the manifest differs from the one of the VM its spec template was rendered for,
+                # apart from the name and before its extra volumes were added
+                diff = utils.manifest_diff(stamp(vm.template.res, TEMPLATE_NAME, vm.name), vm.res)
+                context.logger.info(f"Defined {vm.name} like {vm.template.name}, with changes {json.dumps(diff)}")
 
     @when("I create the VM(?:s)?")
     def create_vms(context):
         """
-        Create multiple VM(s) in the cluster.
+        Create multiple VM(s) in the cluster, concurrently.
+
+        The VMs exist once their server-side apply returns, the watch of the
+        next step takes over instead of waiting for each of them here.
         """
-        for vm in context.vms:
-            vm.create(wait=True)
+        context.tracker.apply(context, context.vms)
 
     @then("the VM(?:s)? status should change to Running")
     def vms_should_be_running(context):
@@ -55,9 +78,12 @@ class VMSteps:
         Monitor the VirtualMachine(s) status and wait for it to reach the Running state.
 
         Raises:
-            TimeoutExpiredError: If the VirtualMachine fails to reach 'Running' status within timeout
+            BehaveScenarioError: If any VirtualMachine fails to reach 'Running' status within timeout
         """
-        for vm in context.vms:
+
+        def start(vm):
+            # Capture the boot from the serial console while waiting for the VM
+            vm.start_console(log_dir=context.scenario_dir / "consoles")
             try:
                 vm.start(wait=True)
                 context.logger.info(f"VirtualMachine {vm.name} is running")
@@ -70,24 +96,29 @@ class VMSteps:
                 )
                 raise
 
+        run_concurrently(context, start, context.vms)
+
     @then(r"I can access the VM(?:s)?")
     def access_vm(context):
         """
         Access the VirtualMachine and verify it is running.
         """
-        for vm in context.vms:
-            vm.wait_for_console_login()
-            vm.wait_for_ssh_login()
+        # Console logins are driven by a single thread, wait for all of them at once
+        run_concurrently(context, lambda vm: vm.wait_for_console_login(), context.vms, workers=len(context.vms))
+        run_concurrently(context, lambda vm: vm.ssh_pool.connect(), context.vms)
 
     @when("I perform a deletion of the VM(?:s)?")
     def delete_vms(context):
         """
         Remove the VirtualMachine(s) from the cluster and ensure deletion is finished.
         """
+
         for vm in context.vms:
-            vm.stop(wait=True)
-            vm.delete(wait=True)
-            context.logger.info(f"VirtualMachine {vm.name} is deleted")
+            vm.ssh_pool.close()
+            vm.close_console()
+        # Deleting a VirtualMachine deletes its VirtualMachineInstance, no need to stop it first
+        context.tracker.delete(context.vms)
+        context.logger.info(f"VirtualMachine(s) {', '.join(vm.name for vm in context.vms)} are deleted")
 
     @then("the VM(?:s)? should be completely removed")
     def vms_should_not_exist(context):
@@ -103,4 +134,4 @@ class VMSteps:
         for vm in context.vms:
             assert not vm.exists, f"VirtualMachine '{vm.name}' still exists after deletion."
             context.logger.info(f'VirtualMachine "{vm.name}" no longer exists')
-            context.vms.remove(vm)
+        context.vms.clear()
@@ -1,5 +1,54 @@
+import json
+
 from behave import given, when
-from timeout_sampler import TimeoutExpiredError, TimeoutSampler
+
+import utils
+from ocp.migration import MigrationOrchestrator
+from utils.exceptions import BehaveScenarioError
+
+
+def run_migrations(context):
+    """
+    Migrate all VMs at once and record the timing of every migration.
+
+    Each run appends its statistics and per-migration phase timestamps to
+    migrations.jsonl in the scenario directory. The VMIMs are deleted once
+    the run is over, so they do not pile up in the namespace.
+
+    Raises:
+        BehaveScenarioError: If any migration fails or times out
+    """
+    orchestrator = MigrationOrchestrator(
+        context.vms,
+        max_in_flight=int(context.params["migration"]["max_in_flight"]),
+        timeout=int(context.params["migration"]["timeout"]),
+        tracker=context.tracker,
+    )
+    try:
+        records = orchestrator.run()
+    finally:
+        try:
+            context.tracker.delete([record.vmim for record in orchestrator.records])
+        except Exception as exc:
+            # Left to the namespace reset, without hiding why the migrations failed
+            context.logger.error(f"Failed to delete the migrations: {exc}")
+    stats = orchestrator.stats()
+    with open(context.scenario_dir / "migrations.jsonl", "a") as result_file:
+        result_file.write(json.dumps({"stats": stats, "migrations": [record.to_dict() for record in records]}) + "\n")
+    context.logger.info(
+        f"Migrated {stats['succeeded']}/{stats['migrations']} VMs in {stats['wall_time']:.1f}s, "
+        f"latency median {stats['latency'].get('median')}s p95 {stats['latency'].get('p95')}s"
+    )
+    utils.rp_attach_json(context.logger.info, "Migration statistics", "migrations.json", stats)
+
+    failures = [f"{record.name}: {record.error}" for record in records if record.error]
+    for failure in failures:
+        context.logger.error(f"Migration {failure}")
+    if failures:
+        raise BehaveScenarioError(
+            context.scenario.name,
+            f"{len(failures)} of {len(records)} migrations failed: {'; '.join(failures)}",
+        )
 
 
 class MigrationSteps:
@@ -11,28 +60,18 @@ class MigrationSteps:
         context.params["vm"]["access_modes"] = "ReadWriteMany"
         context.execute_steps(f"Given {count} VM{'' if int(count) == 1 else 's'}")
 
-    @when(r"I migrate the VM(?:s)?")
+    @when(r"I migrate the VM(?:s)?$")
     def migrate_vms(context):
-        for vm in context.vms:
-            vm.migrate()
+        """
+        Migrate the VirtualMachine(s) to other nodes.
+        """
+        run_migrations(context)
 
     @when(r"I migrate the VM(?:s)? (?P<count>\d+) times")
     def migrate_vms_multi_times(context, count):
-        for i in range(1, count + 1):
-            vmims = []
+        """
+        Migrate the VirtualMachine(s) to other nodes, count times in a row.
+        """
+        for i in range(1, int(count) + 1):
             context.logger.info(f"Migrate the VMs in loop: {i}")
-            for vm in context.vms:
-                vmims.append(vm.migrate(wait=False))
-
-            for vmim in vmims:
-                try:
-                    for sample in TimeoutSampler(
-                        wait_timeout=360,
-                        sleep=10,
-                        func=lambda: vmim.instance.status.phase,
-                    ):
-                        if sample == vmim.Status.SUCCEEDED:
-                            break
-                except TimeoutExpiredError as exc:
-                    context.logger.error(f"Migration {vmim.name} failed: {exc}")
-                    raise
+            run_migrations(context)
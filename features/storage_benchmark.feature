@@ -0,0 +1,25 @@
+@vm @benchmark
+Feature: Storage benchmark
+    As a KubeSAN developer,
+    I want to measure the I/O performance of KubeSAN volumes from inside a VM,
+    So that I can track performance regressions of the storage driver.
+
+    Background: 1 basic VM
+        Given 1 VM
+
+    Scenario Outline: Benchmark hotplugged PVCs
+        Given <pvcs> PVCs
+        When  I create the VM
+        And   I create the PVCs
+        Then  the VM status should change to Running
+        And   the PVCs status should change to Bound
+        When  I hotplug <pvcs> PVCs to the running VM
+        Then  the VM should be able to access the new PVCs
+        When  I run the fio <profiles> benchmarks on the new PVCs
+        And   I perform a deletion of the VM
+        Then  the VM should be completely removed
+
+        Examples:
+            | pvcs | profiles                        |
+            | 1    | all                             |
+            | 2    | rand_read, rand_write, mixed    |
@@ -0,0 +1,27 @@
+from ocp_resources import datavolume
+from ocp_resources.utils.constants import TIMEOUT_2MINUTES, TIMEOUT_10MINUTES
+
+from ocp.persistent_volume_claim import PersistentVolumeClaim
+from ocp.resource import CachedResource
+from utils.metrics import timed
+
+
+class DataVolume(CachedResource, datavolume.DataVolume):
+    """
+    DataVolume reading its state from the shared watch cache.
+    """
+
+    @timed("wait_for_dv_success")
+    def wait_for_dv_success(self, timeout=TIMEOUT_10MINUTES, failure_timeout=TIMEOUT_2MINUTES, *args, **kwargs):
+        """
+        Wait for the DataVolume to succeed.
+        """
+        return super().wait_for_dv_success(timeout, failure_timeout, *args, **kwargs)
+
+    @property
+    def pvc(self):
+        return PersistentVolumeClaim(
+            client=self.client,
+            name=self.name,
+            namespace=self.namespace,
+        )
@@ -0,0 +1,135 @@
+import threading
+
+from ocp_resources.namespace import Namespace
+from ocp_resources.utils.constants import TIMEOUT_10MINUTES
+
+import utils
+from ocp.datavolume import DataVolume
+from ocp.tracker import RUN_LABELS
+from utils.watch import Watcher
+
+
+class GoldenImage:
+    """
+    A source DataVolume imported once and cloned by many VMs.
+    """
+
+    def __init__(self, dv, timeout=TIMEOUT_10MINUTES):
+        """
+        Initialize a GoldenImage.
+
+        :param dv: The DataVolume importing the image, not created yet.
+        :param timeout: Time in seconds the import may take.
+        """
+        self.dv = dv
+        self.timeout = timeout
+        self.ready = False
+        self._lock = threading.Lock()
+
+    def ensure(self):
+        """
+        Import the image unless it was imported already.
+
+        Concurrent callers wait for the first one to finish the import. A
+        failed import is deleted, so the next caller starts over.
+        """
+        with self._lock:
+            if self.ready:
+                return self.dv
+            try:
+                self.dv.create()
+                self.dv.wait_for_dv_success(timeout=self.timeout)
+            except Exception:
+                self.dv.clean_up()
+                raise
+            self.ready = True
+            return self.dv
+
+
+class GoldenImagePool:
+    """
+    Import each image once per StorageClass and let VMs clone it.
+
+    Golden images live in a namespace of their own, created on first use,
+    so they outlive the per-feature namespaces. VM root disks are then
+    DataVolumes with a pvc source pointing at the golden image, which CDI
+    turns into a CSI clone or snapshot on storage supporting it, e.g.
+    KubeSAN in thin mode, instead of a full import per VM.
+    """
+
+    def __init__(self, client, timeout=TIMEOUT_10MINUTES):
+        """
+        Initialize the pool.
+
+        :param client: DynamicClient to create the golden images with.
+        :param timeout: Time in seconds an import may take.
+        """
+        self.client = client
+        self.timeout = timeout
+        self.namespace = None
+        self._images = {}
+        self._lock = threading.Lock()
+
+    def _ensure_namespace(self):
+        """
+        Create the namespace of the golden images, once.
+        """
+        if self.namespace is None:
+            ns = Namespace(
+                name=f"kubesan-golden-{utils.generate_random_string()}",
+                client=self.client,
+                label=RUN_LABELS,
+            )
+            ns.create(wait=True)
+            ns.logger.info(f"Created golden image namespace '{ns.name}'")
+            self.namespace = ns
+        return self.namespace
+
+    def get(self, url, storage_class, size, source="registry", access_modes=None, volume_mode=None):
+        """
+        Get the golden image of url on storage_class, importing it if needed.
+
+        :param url: URL of the image.
+        :param storage_class: StorageClass of the golden image and of its clones.
+        :param size: Size of the golden image, clones must not be smaller.
+        :param source: Source of the import, registry or http.
+        :return: The DataVolume of the golden image, imported.
+        """
+        key = (url, storage_class, size, access_modes, volume_mode)
+        with self._lock:
+            image = self._images.get(key)
+            if image is None:
+                dv = DataVolume(
+                    name=f"golden-{utils.generate_random_string(8)}",
+                    namespace=self._ensure_namespace().name,
+                    client=self.client,
+                    source=source,
+                    url=url,
+                    storage_class=storage_class,
+                    size=size,
+                    access_modes=access_modes,
+                    volume_mode=volume_mode,
+                )
+                image = self._images[key] = GoldenImage(dv, timeout=self.timeout)
+        return image.ensure()
+
+    def release(self, storage_class):
+        """
+        Delete the golden images on storage_class, before it is deleted.
+        """
+        with self._lock:
+            keys = [key for key in self._images if key[1] == storage_class]
+            images = [self._images.pop(key) for key in keys]
+        for image in images:
+            image.dv.clean_up()
+
+    def close(self):
+        """
+        Delete all golden images and their namespace.
+        """
+        if self.namespace is None:
+            return
+        Watcher.for_client(self.client).stop(namespace=self.namespace.name)
+        self.namespace.delete(wait=True)
+        self.namespace = None
+        self._images.clear()
@@ -0,0 +1,210 @@
+import queue
+import time
+
+from ocp_resources.utils.constants import TIMEOUT_10MINUTES
+from ocp_resources.virtual_machine_instance_migration import VirtualMachineInstanceMigration
+
+import utils
+from ocp.resource import TEST_LABELS
+from utils.metrics import METRICS
+from utils.stats import summarize
+from utils.watch import Watcher
+
+
+class MigrationRecord:
+    """
+    Timing of a single VirtualMachineInstanceMigration.
+    """
+
+    def __init__(self, vm, vmim):
+        """
+        Initialize a MigrationRecord.
+        """
+        self.vm = vm
+        self.vmim = vmim
+        self.name = vmim.name
+        self.created = None
+        self.phases = {}
+        self.server_phases = {}
+        self.error = None
+        self.reported = False
+
+    @property
+    def phase(self):
+        """
+        Get the last observed phase.
+        """
+        phases = dict(self.phases)
+        return max(phases, key=phases.get) if phases else None
+
+    @property
+    def finished(self):
+        """
+        Whether the migration reached a final phase or failed to run.
+        """
+        return bool(self.error) or self.phase in (self.vmim.Status.SUCCEEDED, self.vmim.Status.FAILED)
+
+    @property
+    def latency(self):
+        """
+        Get the time from creation to success in seconds, None if it did not succeed.
+        """
+        succeeded = self.phases.get(self.vmim.Status.SUCCEEDED)
+        return succeeded - self.created if succeeded and self.created else None
+
+    def phase_durations(self):
+        """
+        Get the time spent in each phase in seconds.
+        """
+        timeline = sorted(self.phases.items(), key=lambda item: item[1])
+        return {phase: end - start for (phase, start), (_, end) in zip(timeline, timeline[1:])}
+
+    def observe(self, obj):
+        """
+        Record the phase of a VMIM seen by the watch.
+        """
+        status = obj.status
+        if not status:
+            return
+        if status.phase and status.phase not in self.phases:
+            self.phases[status.phase] = time.time()
+        for transition in status.phaseTransitionTimestamps or []:
+            self.server_phases[transition.phase] = transition.phaseTransitionTimestamp
+
+    def to_dict(self):
+        """
+        Convert the record to a JSON serializable dict.
+        """
+        return {
+            "vm": self.vm.name,
+            "vmim": self.name,
+            "created": self.created,
+            "phase": self.phase,
+            "phases": self.phases,
+            "server_phases": self.server_phases,
+            "phase_durations": self.phase_durations(),
+            "latency": self.latency,
+            "error": self.error,
+        }
+
+
+class MigrationOrchestrator:
+    """
+    Migrate many VMs at once and measure every migration.
+
+    At most max_in_flight VMIMs are running at a time; the next one is
+    launched as soon as one finishes. All of them are followed through the
+    single VMIM watch of the namespace, which records when each migration
+    enters each phase.
+    """
+
+    def __init__(self, vms, max_in_flight=10, timeout=TIMEOUT_10MINUTES, tracker=None):
+        """
+        Initialize the orchestrator.
+
+        :param vms: VMs to migrate, all in the same namespace.
+        :param max_in_flight: Maximum number of migrations running at the same time.
+        :param timeout: Time in seconds a single migration may take.
+        :param tracker: ResourceTracker to register the VMIMs with, so they can be deleted in bulk.
+        """
+        self.vms = list(vms)
+        self.tracker = tracker
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.records = []
+        self.wall_time = None
+
+    def _vmim(self, vm):
+        """
+        Define a VMIM with a unique name for vm.
+        """
+        vmim = VirtualMachineInstanceMigration(
+            name=f"kubevirt-migrate-{vm.name}-{utils.generate_random_string()}",
+            namespace=vm.namespace,
+            client=vm.client,
+            vmi_name=vm.name,
+            label=TEST_LABELS,
+            teardown=False,
+        )
+        if self.tracker is not None:
+            self.tracker.register(vmim)
+        return vmim
+
+    def run(self):
+        """
+        Migrate the VMs and wait for all migrations to finish.
+
+        :return: A MigrationRecord per VM.
+        """
+        self.records = [MigrationRecord(vm, self._vmim(vm)) for vm in self.vms]
+        if not self.records:
+            return self.records
+        by_name = {record.name: record for record in self.records}
+        finished = queue.Queue()
+
+        def listener(event_type, obj):
+            record = by_name.get(obj.metadata.name)
+            if record is None or record.reported:
+                return
+            record.observe(obj)
+            if record.finished:
+                record.reported = True
+                finished.put(record)
+
+        first = self.records[0]
+        watch = Watcher.for_client(first.vm.client).watch(first.vmim)
+        watch.add_listener(listener)
+        pending = list(self.records)
+        in_flight = {}
+        start = time.time()
+        with METRICS.timed("operation", "migrate", kind=first.vmim.kind, migrations=len(self.records)):
+            try:
+                while pending or in_flight:
+                    while pending and len(in_flight) < self.max_in_flight:
+                        record = pending.pop(0)
+                        record.created = time.time()
+                        try:
+                            record.vmim.create()
+                        except Exception as exc:
+                            record.error = str(exc)
+                            continue
+                        in_flight[record.name] = record
+                    if not in_flight:
+                        continue
+
+                    deadline = min(record.created for record in in_flight.values()) + self.timeout
+                    try:
+                        in_flight.pop(finished.get(timeout=max(deadline - time.time(), 0)).name, None)
+                    except queue.Empty:
+                        for record in list(in_flight.values()):
+                            if record.created + self.timeout <= time.time():
+                                record.error = f"Timed out after {self.timeout}s in phase {record.phase}"
+                                in_flight.pop(record.name)
+            finally:
+                watch.remove_listener(listener)
+                self.wall_time = time.time() - start
+
+        for record in self.records:
+            if record.phase == record.vmim.Status.FAILED and not record.error:
+                record.error = "Migration failed"
+        return self.records
+
+    def stats(self):
+        """
+        Get throughput and latency statistics of the last run.
+        """
+        succeeded = [record for record in self.records if record.latency is not None]
+        phase_durations = {}
+        for record in succeeded:
+            for phase, duration in record.phase_durations().items():
+                phase_durations.setdefault(phase, []).append(duration)
+        return {
+            "migrations": len(self.records),
+            "succeeded": len(succeeded),
+            "failed": len(self.records) - len(succeeded),
+            "max_in_flight": self.max_in_flight,
+            "wall_time": self.wall_time,
+            "throughput_per_minute": len(succeeded) * 60 / self.wall_time if self.wall_time else None,
+            "latency": summarize(record.latency for record in succeeded),
+            "phases": {phase: summarize(durations) for phase, durations in phase_durations.items()},
+        }
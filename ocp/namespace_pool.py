@@ -0,0 +1,200 @@
+import logging
+import queue
+import threading
+import time
+
+from ocp_resources.datavolume import DataVolume
+from ocp_resources.persistent_volume_claim import PersistentVolumeClaim
+from ocp_resources.utils.constants import TIMEOUT_4MINUTES
+from ocp_resources.virtual_machine import VirtualMachine
+from ocp_resources.virtual_machine_instance_migration import VirtualMachineInstanceMigration
+from timeout_sampler import TimeoutExpiredError
+
+from ocp.resource import TEST_LABELS
+from utils.watch import Watcher
+
+LOGGER = logging.getLogger(__name__)
+
+# Kinds of the test objects, in the order they are deleted on reset
+RESET_KINDS = (VirtualMachineInstanceMigration, VirtualMachine, DataVolume, PersistentVolumeClaim)
+
+
+class Reaper:
+    """
+    Run teardown work on a background thread, one job after another.
+
+    Failures are logged and collected instead of being raised, teardown of
+    one feature should not break the next one.
+    """
+
+    def __init__(self):
+        """
+        Initialize the reaper and start its thread.
+        """
+        self.errors = []
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="ksantt-reaper", daemon=True)
+        self._thread.start()
+
+    def submit(self, func, *args):
+        """
+        Queue func(*args).
+        """
+        self._queue.put((func, args))
+
+    def _run(self):
+        """
+        Run the queued jobs.
+        """
+        while True:
+            func, args = self._queue.get()
+            try:
+                func(*args)
+            except Exception as exc:
+                LOGGER.error(f"Teardown {func.__name__} failed: {exc}")
+                self.errors.append(exc)
+            finally:
+                self._queue.task_done()
+
+    def join(self):
+        """
+        Wait for all queued jobs.
+
+        :return: The exceptions raised by the jobs so far.
+        """
+        self._queue.join()
+        return self.errors
+
+
+def _kind_api(client, kind):
+    """
+    Get the dynamic API of an ocp_resources class.
+    """
+    if kind.api_version:
+        return client.resources.get(api_version=kind.api_version, kind=kind.kind)
+    return client.resources.get(group=kind.api_group, kind=kind.kind, preferred=True)
+
+
+def reset_namespace(client, namespace, timeout=TIMEOUT_4MINUTES):
+    """
+    Delete the test objects of a namespace and wait for them to be gone.
+
+    Objects are deleted per kind with a single deletecollection request
+    selecting TEST_LABELS, the namespace itself is kept. Their removal is
+    followed through the shared Watcher.
+
+    :raises TimeoutExpiredError: If objects are left after timeout
+    """
+    label_selector = ",".join(f"{key}={value}" for key, value in TEST_LABELS.items())
+    watcher = Watcher.for_client(client)
+    watches = []
+    for kind in RESET_KINDS:
+        api = _kind_api(client, kind)
+        api.delete(namespace=namespace, label_selector=label_selector)
+        watches.append(watcher.watch_kind(api, namespace))
+    start_time = time.monotonic()
+    for resource_watch in watches:
+        remaining = max(timeout - (time.monotonic() - start_time), 0)
+        pending = resource_watch.wait_for_all(resource_watch.select(TEST_LABELS), lambda obj: obj is None, remaining)
+        if pending:
+            raise TimeoutExpiredError(
+                f"{resource_watch.kind} {', '.join(pending)} in {namespace}",
+                elapsed_time=time.monotonic() - start_time,
+            )
+
+
+class NamespacePool:
+    """
+    Keep namespaces and StorageClasses across features.
+
+    A feature acquires a namespace and StorageClass pair and releases it when
+    it is done. The reaper then deletes the labelled test objects of the
+    namespace, after which the pair is handed out again. Up to size pairs are
+    created, so the reset of a released pair overlaps with the next feature.
+    Namespaces and StorageClasses are only deleted by close().
+    """
+
+    def __init__(self, client, create_namespace, create_storage_class, reaper, size=2):
+        """
+        Initialize the pool.
+
+        :param client: DynamicClient to reset the namespaces with.
+        :param create_namespace: Callable creating a new namespace.
+        :param create_storage_class: Callable creating a new StorageClass.
+        :param reaper: Reaper resetting the released pairs.
+        :param size: Maximum number of pairs.
+        """
+        self.client = client
+        self.create_namespace = create_namespace
+        self.create_storage_class = create_storage_class
+        self.reaper = reaper
+        self.size = size
+        self._slots = []
+        self._free = []
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        """
+        Get a clean namespace and StorageClass, creating them if the pool is not full.
+
+        :return: A (Namespace, StorageClass) tuple.
+        """
+        with self._cond:
+            while not self._free and len(self._slots) >= self.size:
+                self._cond.wait()
+            if self._free:
+                return self._free.pop()
+            # Reserve the slot before creating it outside of the lock
+            self._slots.append(None)
+        try:
+            slot = (self.create_namespace(), self.create_storage_class())
+        except Exception:
+            with self._cond:
+                self._slots.remove(None)
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._slots[self._slots.index(None)] = slot
+        return slot
+
+    def _reset(self, slot):
+        """
+        Reset a released slot and put it back in the pool, or drop it if that fails.
+        """
+        try:
+            reset_namespace(self.client, slot[0].name)
+        except Exception:
+            with self._cond:
+                self._slots.remove(slot)
+                self._cond.notify()
+            self._delete(slot)
+            raise
+        with self._cond:
+            self._free.append(slot)
+            self._cond.notify()
+
+    @staticmethod
+    def _delete(slot):
+        ns, sc = slot
+        ns.delete(wait=True)
+        sc.delete(wait=True)
+
+    def release(self, slot):
+        """
+        Give a slot back, it is reset in the background.
+        """
+        self.reaper.submit(self._reset, slot)
+
+    def close(self):
+        """
+        Delete all namespaces and StorageClasses of the pool.
+        """
+        self.reaper.join()
+        with self._cond:
+            slots, self._slots, self._free = [slot for slot in self._slots if slot], [], []
+        # Delete all namespaces before waiting, so their finalizers run together
+        for ns, _ in slots:
+            ns.delete()
+        for ns, sc in slots:
+            ns.wait_deleted()
+            sc.delete(wait=True)
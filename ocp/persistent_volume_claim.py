@@ -0,0 +1,9 @@
+from ocp_resources import persistent_volume_claim
+
+from ocp.resource import CachedResource
+
+
+class PersistentVolumeClaim(CachedResource, persistent_volume_claim.PersistentVolumeClaim):
+    """
+    PersistentVolumeClaim reading its state from the shared watch cache.
+    """
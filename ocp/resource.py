@@ -0,0 +1,70 @@
+from ocp_resources.utils.constants import TIMEOUT_4MINUTES
+
+from utils.metrics import timed
+from utils.watch import Watcher
+
+# Labels of every object created by the tests, objects of a namespace are reset by them
+TEST_LABELS = {"app.kubernetes.io/managed-by": "ksantt"}
+
+
+class CachedResource:
+    """
+    Mixin serving resource reads from the shared watch cache.
+
+    instance, and everything built on it (exists, status, ...), is read from
+    the namespace-scoped cache kept current by utils.watch. Objects the cache
+    has not seen yet, e.g. right after create(), are read from the API server.
+    Strongly consistent reads are opt-in, either with read(consistent=True) or
+    by setting consistent_reads on the object.
+    """
+
+    consistent_reads = False
+
+    def to_dict(self):
+        """
+        Generate the resource dict, labelled as a test object.
+        """
+        super().to_dict()
+        self.res.setdefault("metadata", {}).setdefault("labels", {}).update(TEST_LABELS)
+
+    @property
+    def instance(self):
+        """
+        Get resource instance from the cache.
+        """
+        return self.read()
+
+    def read(self, consistent=False):
+        """
+        Get resource instance.
+
+        :param consistent: Whether to GET the object from the API server instead of the cache.
+        """
+        if not (consistent or self.consistent_reads):
+            obj = Watcher.for_client(self.client).get(self)
+            if obj is not None:
+                return obj
+        return super().instance
+
+    @timed("create")
+    def create(self, wait=False):
+        """
+        Create resource.
+        """
+        return super().create(wait=wait)
+
+    @timed("delete")
+    def delete(self, wait=False, timeout=TIMEOUT_4MINUTES, body=None):
+        """
+        Delete resource.
+        """
+        return super().delete(wait=wait, timeout=timeout, body=body)
+
+    @timed("wait_for_status")
+    def wait_for_status(self, status, timeout=TIMEOUT_4MINUTES, stop_status=None):
+        """
+        Wait for resource to be in status, driven by watch events.
+
+        There is no polling interval, the status is checked on every event of the watch.
+        """
+        Watcher.for_client(self.client).wait_for_status(self, status, timeout=timeout, stop_status=stop_status)
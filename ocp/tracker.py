@@ -0,0 +1,250 @@
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+
+from kubernetes.dynamic.exceptions import ConflictError, DynamicApiError
+from ocp_resources.namespace import Namespace
+from ocp_resources.storage_class import StorageClass
+from ocp_resources.utils.constants import TIMEOUT_4MINUTES
+
+import utils
+from ocp.resource import TEST_LABELS
+from utils.concurrency import max_workers, run_concurrently
+from utils.exceptions import ApplyError
+from utils.metrics import METRICS
+from utils.runner import RUN_ID_ENV
+from utils.watch import Watcher
+
+LOGGER = logging.getLogger(__name__)
+
+FIELD_MANAGER = "ksantt"
+TRACK_LABEL = "ksantt.kubesan.io/tracker"
+HEARTBEAT_ANNOTATION = "ksantt.kubesan.io/heartbeat"
+RUN_LABEL = "ksantt.kubesan.io/run"
+# Shared by the workers of a parallel run, see utils.runner
+RUN_ID = os.getenv(RUN_ID_ENV) or utils.generate_random_string(8)
+RUN_LABELS = {**TEST_LABELS, RUN_LABEL: RUN_ID}
+
+
+class ResourceTracker:
+    """
+    Track the objects created by the steps, apply and delete them in bulk.
+
+    Objects are applied with server-side apply from a bounded pool of
+    threads sharing the connection pool of their client, so creating a step's
+    objects takes no get before each create and no wait after it, and
+    conflicts are reported per object. Registered objects are labelled with the id of the
+    tracker. Deleting them takes a single deletecollection request per kind
+    and namespace selecting that label, then waits for all of them to be gone
+    through the namespace watch of their kind, instead of one delete and one
+    wait per object.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty tracker.
+        """
+        self.id = utils.generate_random_string(8)
+        self.objects = []
+
+    def register(self, obj):
+        """
+        Label an object and track it.
+
+        The label is set on the object rather than only on its res, since
+        create() renders res again with to_dict().
+        """
+        obj.label = {**(obj.label or {}), TRACK_LABEL: self.id}
+        if obj.res:
+            obj.res.setdefault("metadata", {}).setdefault("labels", {})[TRACK_LABEL] = self.id
+        self.objects.append(obj)
+        return obj
+
+    @staticmethod
+    def _apply(obj, force=False):
+        """
+        Create an object with server-side apply.
+
+        Apply creates or updates, so an object of the same name left behind,
+        e.g. in a pooled namespace, would be silently adopted. Objects already
+        known to the watch cache of their kind are refused instead, as
+        create() would. The check waits for the initial list of the watch,
+        which apply() starts for every kind and namespace before applying.
+
+        :raises ApplyError: If the object exists already, or the API server rejects it, e.g. on a conflict.
+        """
+        obj.to_dict()
+        if Watcher.for_client(obj.client).get(obj) is not None:
+            raise ApplyError(obj.kind, obj.name, True, "already exists, not adopting it")
+        try:
+            # Recorded as create, as by CachedResource.create, to compare with runs creating one by one
+            with METRICS.timed("operation", "create", kind=obj.kind, resource=obj.name, method="apply"):
+                return obj.client.server_side_apply(
+                    obj.api,
+                    body=obj.res,
+                    namespace=obj.namespace,
+                    field_manager=FIELD_MANAGER,
+                    force_conflicts=force,
+                )
+        except DynamicApiError as exc:
+            raise ApplyError(obj.kind, obj.name, isinstance(exc, ConflictError), exc.summary()) from exc
+
+    def apply(self, context, objs, force=False, before=None):
+        """
+        Create objects with server-side apply, concurrently.
+
+        At most concurrency.max_workers requests are in flight, and no more
+        than the connection pool of the client holds, so every request reuses
+        a pooled connection instead of opening its own.
+
+        :param objs: Objects to apply, e.g. context.vms.
+        :param force: Whether to take over the fields owned by another field manager instead of conflicting.
+        :param before: Callable given each object right before its request.
+        :raises BehaveScenarioError: Listing every object which failed to apply, and whether it conflicts
+        """
+        objs = list(objs)
+        if not objs:
+            return
+        workers = max_workers(context)
+        pool_size = objs[0].client.client.configuration.connection_pool_maxsize
+        if pool_size:
+            workers = min(workers, pool_size)
+
+        # Start the watch of every kind and namespace up front, so their initial lists run side by side
+        # instead of the existence check of the first object of each group waiting for its own
+        watcher = Watcher.for_client(objs[0].client)
+        for obj in {(obj.kind, obj.namespace): obj for obj in objs}.values():
+            watcher.watch(obj)
+
+        def apply(obj):
+            if before:
+                before(obj)
+            return self._apply(obj, force=force)
+
+        run_concurrently(context, apply, objs, workers=workers)
+
+    def delete(self, objs, timeout=TIMEOUT_4MINUTES):
+        """
+        Delete objects and wait until they are gone.
+
+        Objects of a kind and namespace are deleted with deletecollection if
+        they are all the tracked objects of that kind and namespace, one by
+        one otherwise.
+
+        :param objs: Tracked objects to delete.
+        :param timeout: Time in seconds to wait for all of them.
+        """
+        groups = {}
+        for obj in objs:
+            groups.setdefault((obj.kind, obj.namespace), []).append(obj)
+        for (kind, namespace), group in groups.items():
+            tracked = [obj for obj in self.objects if (obj.kind, obj.namespace) == (kind, namespace)]
+            if len(group) == len(tracked):
+                group[0].logger.info(f"Delete {len(group)} {kind} in {namespace}")
+                group[0].api.delete(namespace=namespace, label_selector=f"{TRACK_LABEL}={self.id}")
+            else:
+                for obj in group:
+                    obj.delete()
+
+        deadline = time.monotonic() + timeout
+        for obj in objs:
+            Watcher.for_client(obj.client).wait_deleted(obj, timeout=max(deadline - time.monotonic(), 0))
+            self.objects.remove(obj)
+
+
+class Heartbeat:
+    """
+    Keep the namespaces and StorageClasses of the run marked as alive.
+
+    Every interval, the objects labelled with the id of the run are
+    annotated with the current time. collect_leaks only deletes the objects
+    of other runs whose last heartbeat is older than its max_age, so a run
+    lasting longer than that is not reaped by another one.
+    """
+
+    def __init__(self, client, interval):
+        """
+        Initialize a Heartbeat.
+
+        :param interval: Time in seconds between heartbeats.
+        """
+        self.client = client
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="ksantt-heartbeat", daemon=True)
+
+    def start(self):
+        """
+        Beat once, then keep beating in the background.
+        """
+        self.beat()
+        self._thread.start()
+        return self
+
+    def beat(self):
+        """
+        Annotate the objects of the run with the current time.
+        """
+        body = {"metadata": {"annotations": {HEARTBEAT_ANNOTATION: datetime.now(timezone.utc).isoformat()}}}
+        for kind in (Namespace, StorageClass):
+            api = kind(name=kind.kind.lower(), client=self.client).api
+            for obj in api.get(label_selector=f"{RUN_LABEL}={RUN_ID}").items:
+                api.patch(name=obj.metadata.name, body=body, content_type="application/merge-patch+json")
+
+    def _run(self):
+        """
+        Beat every interval until stopped.
+        """
+        while not self._stop.wait(self.interval):
+            try:
+                self.beat()
+            except Exception as exc:
+                LOGGER.warning(f"Heartbeat of run {RUN_ID} failed: {exc}")
+
+    def stop(self):
+        """
+        Stop beating.
+        """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+
+
+def last_seen(obj):
+    """
+    Get the time of the last heartbeat of an object, its creation time if it has none.
+    """
+    annotations = obj.metadata.annotations or {}
+    timestamp = annotations.get(HEARTBEAT_ANNOTATION) or obj.metadata.creationTimestamp
+    return datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+
+
+def collect_leaks(client, max_age, logger):
+    """
+    Delete the namespaces and StorageClasses left behind by crashed runs.
+
+    An object is leaked when it carries TEST_LABELS, belongs to another run
+    and that run has not refreshed its heartbeat for max_age, see Heartbeat.
+    Deletion is not waited for.
+
+    :param max_age: Time in seconds without heartbeat from which objects of other runs are leaked.
+    :return: The deleted objects, as ResourceInstances.
+    """
+    label_selector = ",".join(f"{key}={value}" for key, value in TEST_LABELS.items())
+    now = datetime.now(timezone.utc)
+    leaked = []
+    for kind in (Namespace, StorageClass):
+        api = kind(name=kind.kind.lower(), client=client).api
+        for obj in api.get(label_selector=label_selector).items:
+            labels = obj.metadata.labels or {}
+            if labels.get(RUN_LABEL) == RUN_ID or (now - last_seen(obj)).total_seconds() < max_age:
+                continue
+            logger.warning(
+                f"Deleting {kind.kind} {obj.metadata.name} leaked by run {labels.get(RUN_LABEL)}, "
+                f"last seen {last_seen(obj).isoformat()}"
+            )
+            api.delete(name=obj.metadata.name)
+            leaked.append(obj)
+    return leaked
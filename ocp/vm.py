@@ -1,8 +1,8 @@
-from functools import wraps
+import functools
+import threading
 
 import paramiko
 import yaml
-from ocp_resources.datavolume import DataVolume
 from ocp_resources.utils.constants import (
     TIMEOUT_2MINUTES,
     TIMEOUT_4MINUTES,
@@ -12,11 +12,74 @@ from ocp_resources.virtual_machine import VirtualMachine
 from ocp_resources.virtual_machine_instance_migration import VirtualMachineInstanceMigration
 from pyhelper_utils.shell import run_command
 from timeout_sampler import TimeoutExpiredError, TimeoutSampler
+from websocket import WebSocketException
 
+from ocp.datavolume import DataVolume
+from ocp.resource import TEST_LABELS, CachedResource
 from utils.console import Console
+from utils.metrics import timed
+from utils.portforward import PortForward
+from utils.ssh import SSHSessionPool, build_batch_script, parse_batch_output, read_channel
+from utils.watch import Watcher
 
+# Name of the VM in the spec templates
+TEMPLATE_NAME = "__vm_name__"
+_TEMPLATES = {}
+_TEMPLATES_LOCK = threading.Lock()
 
-class VM(VirtualMachine):
+
+@functools.lru_cache
+def cloudinit_user_data(ssh, username, password):
+    """
+    Generate the cloud-init user data, once per set of credentials.
+    """
+    data = {
+        "ssh_pwauth": ssh,
+        "user": username,
+        "password": password,
+        "chpasswd": {"expire": False},
+    }
+    return "#cloud-config\n" + yaml.dump(data, width=1000)
+
+
+def stamp(obj, old, new):
+    """
+    Copy a manifest, replacing every string equal to old with new.
+    """
+    if isinstance(obj, dict):
+        return {key: stamp(value, old, new) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [stamp(value, old, new) for value in obj]
+    return new if obj == old else obj
+
+
+def clear_templates():
+    """
+    Forget the spec templates, e.g. once the namespace they were rendered for is gone.
+    """
+    with _TEMPLATES_LOCK:
+        _TEMPLATES.clear()
+
+
+class VMTemplate:
+    """
+    Spec shared by the VMs defined with the same parameters.
+    """
+
+    def __init__(self, name, res, spec):
+        """
+        Initialize a VMTemplate.
+
+        :param name: Name of the VM the template was rendered for.
+        :param res: Copy of the manifest of that VM without its extra volumes, with its name replaced by TEMPLATE_NAME.
+        :param spec: The spec of res.
+        """
+        self.name = name
+        self.res = res
+        self.spec = spec
+
+
+class VM(CachedResource, VirtualMachine):
     """
     Class representing a Virtual Machine with various configurations.
     """
@@ -28,6 +91,8 @@ class VM(VirtualMachine):
         source,
         storage_class,
         url,
+        source_pvc=None,
+        source_namespace=None,
         access_modes=DataVolume.AccessMode.RWX,
         disk_type="virtio",
         image_pull_policy="IfNotPresent",
@@ -76,6 +141,8 @@ class VM(VirtualMachine):
         # Assign additional properties here
         self.source = source
         self.url = url
+        self.source_pvc = source_pvc
+        self.source_namespace = source_namespace
         self.access_modes = access_modes
         self.volume_mode = volume_mode
         self.size = size
@@ -101,6 +168,8 @@ class VM(VirtualMachine):
         self.username = username
         self.password = password
         self._console = None
+        self.template = None
+        self.ssh_pool = SSHSessionPool(self.wait_for_ssh_login)
         if "cirros" in self.url:
             self.inject_cloud_init = False
             self.username = "cirros"
@@ -110,33 +179,27 @@ class VM(VirtualMachine):
         """
         Generate the cloud-init configuration for the VM.
         """
-        data = {
-            "ssh_pwauth": self.ssh,
-            "user": self.username,
-            "password": self.password,
-            "chpasswd": {"expire": False},
-        }
-        user_data = "#cloud-config\n" + yaml.dump(data, width=1000)
-        return {"userData": user_data}
+        return {"userData": cloudinit_user_data(self.ssh, self.username, self.password)}
 
     def _data_volume(self):
         """
         Create a DataVolume object for the VM's disk.
+
+        Its res is rendered with the VM, see to_dict().
         """
-        dv = DataVolume(
+        return DataVolume(
             name=self.name,
             namespace=self.namespace,
             client=self.client,
             source=self.source,
             url=self.url,
+            source_pvc=self.source_pvc,
+            source_namespace=self.source_namespace,
             storage_class=self.storage_class,
             size=self.size,
             access_modes=self.access_modes,
             volume_mode=self.volume_mode,
         )
-        dv.to_dict()
-        dv.res["spec"]["imagePullPolicy"] = self.image_pull_policy
-        return dv
 
     def _volume_spec(self, volume, hotpluggable=False):
         """
@@ -155,11 +218,45 @@ class VM(VirtualMachine):
             volume_spec[volume_kind]["hotpluggable"] = True
         return disk_spec, volume_spec
 
-    def to_dict(self):
+    def _template_key(self):
         """
-        Convert the VM object to a Kubernetes deployment definition.
+        Get the parameters the spec of the VM depends on, apart from its name and extra volumes.
         """
-        super().to_dict()
+        return (
+            self.namespace,
+            self.source,
+            self.url,
+            self.source_pvc,
+            self.source_namespace,
+            str(self.access_modes),
+            str(self.volume_mode),
+            self.size,
+            self.storage_class,
+            self.image_pull_policy,
+            self.disk_type,
+            self.cpu,
+            self.cpu_sockets,
+            self.cpu_cores,
+            self.cpu_threads,
+            self.cpu_model,
+            self.cpu_placement,
+            self.eviction_strategy,
+            self.memory,
+            self.memory_guest,
+            self.inject_cloud_init,
+            self.ssh,
+            self.network_model,
+            self.run_strategy,
+            self.username,
+            self.password,
+        )
+
+    def _render_spec(self):
+        """
+        Render the spec of the VM, without the extra volumes.
+        """
+        self.dv.to_dict()
+        self.dv.res["spec"]["imagePullPolicy"] = self.image_pull_policy
         self.res["spec"]["runStrategy"] = self.run_strategy
         self.res["spec"]["dataVolumeTemplates"] = [self.dv.res]
 
@@ -209,94 +306,191 @@ class VM(VirtualMachine):
             )
             volumes_spec.append({"name": "cloudinitdisk", "cloudInitNoCloud": self.__cloudinit_data()})
 
-        if self.volumes:
-            for volume in self.volumes:
-                disk_spec, volume_spec = self._volume_spec(volume)
-                disks_spec.append(disk_spec)
-                volumes_spec.append(volume_spec)
-
-        if self.hotpluggable_volumes:
-            for volume in self.hotpluggable_volumes:
-                disk_spec, volume_spec = self._volume_spec(volume, hotpluggable=True)
-                disks_spec.append(disk_spec)
-                volumes_spec.append(volume_spec)
-
         # Configure network
         interfaces_spec = devices_spec.setdefault("interfaces", [])
         interfaces_spec.append({"model": self.network_model, "name": "default", "masquerade": {}})
         networks_spec = template_spec.setdefault("networks", [])
         networks_spec.append({"name": "default", "pod": {}})
 
-    def virtctl_proxy(func):
+    def to_dict(self):
+        """
+        Convert the VM object to a Kubernetes deployment definition.
+
+        The spec is rendered once per set of parameters and kept as a
+        template, with the VM name replaced by a placeholder. The spec of
+        every other VM with the same parameters is a copy of the template
+        stamped with its name, then its extra volumes are added.
+        """
+        super().to_dict()
+        key = self._template_key()
+        with _TEMPLATES_LOCK:
+            template = _TEMPLATES.get(key)
+        if template is None:
+            self._render_spec()
+            res = stamp(self.res, self.name, TEMPLATE_NAME)
+            template = VMTemplate(self.name, res, res["spec"])
+            with _TEMPLATES_LOCK:
+                template = _TEMPLATES.setdefault(key, template)
+        else:
+            self.res["spec"] = stamp(template.spec, TEMPLATE_NAME, self.name)
+            self.dv.res = self.res["spec"]["dataVolumeTemplates"][0]
+        self.template = template
+
+        template_spec = self.res["spec"]["template"]["spec"]
+        disks_spec = template_spec["domain"]["devices"]["disks"]
+        volumes_spec = template_spec["volumes"]
+        for volume in self.volumes:
+            disk_spec, volume_spec = self._volume_spec(volume)
+            disks_spec.append(disk_spec)
+            volumes_spec.append(volume_spec)
+        for volume in self.hotpluggable_volumes:
+            disk_spec, volume_spec = self._volume_spec(volume, hotpluggable=True)
+            disks_spec.append(disk_spec)
+            volumes_spec.append(volume_spec)
+
+    def port_forward(self, port):
+        """
+        Open an in-process port-forward to a port of the VMI.
+        """
+        return PortForward(self.client, self.name, self.namespace, port)
+
+    @timed("start")
+    def start(self, timeout=TIMEOUT_4MINUTES, wait=False):
+        """
+        Start the VM.
+        """
+        return super().start(timeout=timeout, wait=wait)
+
+    @timed("stop")
+    def stop(self, timeout=TIMEOUT_4MINUTES, vmi_delete_timeout=TIMEOUT_4MINUTES, wait=False):
         """
-        Decorator to add ProxyCommand functionality for SSH connections.
+        Stop the VM.
         """
+        return super().stop(timeout=timeout, vmi_delete_timeout=vmi_delete_timeout, wait=wait)
 
-        @wraps(func)
-        def wrapper(self, *args, **kwargs):
-            proxy_cmd = f"virtctl port-forward --stdio=true {self.name}.{self.namespace} 22"
-            kwargs.setdefault("proxy_command", proxy_cmd)
-            return func(self, *args, **kwargs)
+    @timed("wait_for_ready_status")
+    def wait_for_ready_status(self, status, timeout=TIMEOUT_4MINUTES):
+        """
+        Wait for the VM ready status, driven by watch events.
 
-        return wrapper
+        :param status: True for a running VM, None for a stopped VM.
+        :param timeout: Time to wait in seconds.
+        """
+        self.logger.info(f"Wait for {self.kind} {self.name} status to be {'ready' if status is True else status}")
+        Watcher.for_client(self.client).wait_for(
+            self,
+            lambda vm: vm is not None and (vm.status.ready if vm.status else None) == status,
+            timeout=timeout,
+        )
 
-    def wait_for_console_login(self, timeout=TIMEOUT_4MINUTES):
+    @timed("console_login")
+    def wait_for_console_login(self, timeout=TIMEOUT_10MINUTES):
         """
-        Wait for the VM to be ready for SSH login.
+        Wait for the VM to be logged in on its serial console.
+
+        The login is driven by the shared ConsoleMultiplexer, so waiting for
+        many VMs from concurrent threads costs about as much as waiting for
+        the slowest one.
+
+        :param timeout: Time in seconds the VM may take to boot and log in.
         """
-        if self._console:
+        console = self.start_console(timeout=timeout)
+        if console.child is not None:
             return
         self.logger.info(f"Waiting for {self.name} to be ready for console login")
-        self._console = Console(self, timeout=timeout)
-        self._console.connect()
+        console.connect()
 
-    @virtctl_proxy
-    def wait_for_ssh_login(self, timeout=TIMEOUT_2MINUTES, proxy_command=None):
+    def close_console(self):
+        """
+        Stop the serial console, logged in or not.
+        """
+        if self._console is not None:
+            self._console.close()
+            self._console = None
+
+    def start_console(self, log_dir=None, timeout=TIMEOUT_10MINUTES):
+        """
+        Start logging in on the serial console in the background.
+
+        Called before the VM starts, the whole boot is captured to
+        <log_dir>/<name>.log and its phases are recorded in the run metrics.
+        close_console() releases the console and its capture, whether the
+        VM was logged in on it afterwards or not.
+
+        :param log_dir: Directory to capture the console output to, None to not capture it.
+        :param timeout: Time in seconds the VM may take to boot and log in.
+        :return: The Console.
+        """
+        if self._console is None:
+            log_path = log_dir / f"{self.name}.log" if log_dir else None
+            self._console = Console(self, login_timeout=timeout, log_path=log_path)
+        self._console.attach()
+        return self._console
+
+    @timed("ssh_login")
+    def wait_for_ssh_login(self, timeout=TIMEOUT_2MINUTES):
         """
         Create an SSH session for the VM.
         """
         ssh = paramiko.SSHClient()
         ssh.set_missing_host_key_policy(paramiko.AutoAddPolicy())
-        for proxy in TimeoutSampler(
+        for forward in TimeoutSampler(
             wait_timeout=timeout,
-            sleep=10,
-            func=paramiko.ProxyCommand,
-            command_line=proxy_command,
+            sleep=5,
+            func=self.port_forward,
+            exceptions_dict={WebSocketException: [], OSError: []},
+            port=22,
         ):
             try:
                 ssh.connect(
                     hostname=self.name,
                     username=self.username,
                     password=self.password,
-                    sock=proxy,
+                    sock=forward.sock,
                 )
                 return ssh
             except paramiko.ssh_exception.SSHException:
-                proxy.close()
+                forward.close()
 
-    def cmd(self, command, session):
+    def cmd(self, command):
         """
-        Execute a command on the VM using SSH.
+        Execute a command on the VM using a channel from the SSH session pool.
         """
         self.logger.info(f"Execute {command} on {self.name}")
-        _, stdout, stderr = session.exec_command(command)
-        return_code = stdout.channel.recv_exit_status()
-        stdout_str = stdout.read().decode().strip()
-        stderr_str = stderr.read().decode().strip()
-        return return_code, stdout_str, stderr_str
+        with self.ssh_pool.channel() as channel:
+            channel.exec_command(command)
+            stdout, stderr, return_code = read_channel(channel)
+        return return_code, stdout.decode().strip(), stderr.decode().strip()
+
+    def cmd_batch(self, commands):
+        """
+        Execute several commands on the VM in a single SSH channel.
 
-    def cmd_status(self, command, session):
+        :param commands: Shell commands to run, one after another.
+        :return: A CommandResult(rc, stdout, stderr) per command, None for commands that did not run.
+        """
+        self.logger.info(f"Execute {len(commands)} commands on {self.name}: {commands}")
+        script, marker = build_batch_script(commands)
+        with self.ssh_pool.channel() as channel:
+            channel.exec_command("sh -s")
+            channel.sendall(script.encode())
+            channel.shutdown_write()
+            output, _, _ = read_channel(channel)
+        return parse_batch_output(output.decode(), marker, len(commands))
+
+    def cmd_status(self, command):
         """
         Execute a command on the VM and return only the return code.
         """
-        return self.cmd(command, session)[0]
+        return self.cmd(command)[0]
 
-    def cmd_output(self, command, session):
+    def cmd_output(self, command):
         """
         Execute a command on the VM and return the standard output.
         """
-        return self.cmd(command, session)[1]
+        return self.cmd(command)[1]
 
+    @timed("hotplug")
     def hotplug_volume(
         self,
         volume,
@@ -319,7 +513,7 @@ class VM(VirtualMachine):
             "virtctl",
             f"--namespace={self.namespace}",
             "addvolume",
-            self.vmi.name,
+            self.name,
             f"--volume-name={volume.name}",
         ]
         if cache:
@@ -333,6 +527,7 @@ class VM(VirtualMachine):
         run_command(virtctl_cmd)
         self.hotpluggable_volumes.append(volume)
 
+    @timed("hotunplug")
     def hotunplug_volume(self, volume, persist=None):
         # XXX: Define a resource dict + self.update_replace() instead of virtctl?
         """
@@ -345,7 +540,7 @@ class VM(VirtualMachine):
             "virtctl",
             f"--namespace={self.namespace}",
             "removevolume",
-            self.vmi.name,
+            self.name,
             f"--volume-name={volume.name}",
         ]
         if persist:
@@ -353,6 +548,32 @@ class VM(VirtualMachine):
         run_command(virtctl_cmd)
         self.hotpluggable_volumes.remove(volume)
 
+    @timed("wait_for_volume_status")
+    def wait_for_volume_status(self, volume, ready=True, timeout=TIMEOUT_2MINUTES):
+        """
+        Wait for a hotplugged volume to become ready in, or be removed from, the VMI volume status.
+
+        :param volume: The hotplugged volume.
+        :param ready: Whether to wait for the volume to be ready or to be removed.
+        :param timeout: Time to wait in seconds.
+        """
+
+        def _volume_phase(vmi):
+            if vmi is None or not vmi.status:
+                return None
+            for volume_status in vmi.status.volumeStatus or []:
+                if volume_status.name == volume.name:
+                    return volume_status.phase or ""
+            return None
+
+        self.logger.info(f"Wait for volume {volume.name} to be {'ready' if ready else 'removed'} on {self.name}")
+        Watcher.for_client(self.client).wait_for(
+            self.vmi,
+            (lambda vmi: _volume_phase(vmi) == "Ready") if ready else (lambda vmi: _volume_phase(vmi) is None),
+            timeout=timeout,
+        )
+
+    @timed("migrate")
     def migrate(self, wait=True, timeout=TIMEOUT_10MINUTES):
         """
         Migrate the VM to another node.
@@ -361,26 +582,21 @@ class VM(VirtualMachine):
         with VirtualMachineInstanceMigration(
             name=migration_name,
             namespace=self.namespace,
-            vmi_name=self.vmi.name,
+            client=self.client,
+            vmi_name=self.name,
+            label=TEST_LABELS,
             teardown=wait,
         ) as vmim:
             if not wait:
                 return vmim
 
             try:
-                for sample in TimeoutSampler(
-                    wait_timeout=timeout,
-                    sleep=5,
-                    func=lambda: vmim.instance.status.phase,
-                ):
-                    if sample == vmim.Status.SUCCEEDED:
-                        break
+                Watcher.for_client(self.client).wait_for_status(vmim, vmim.Status.SUCCEEDED, timeout=timeout)
             except TimeoutExpiredError as exc:
                 self.logger.error(f"Migration failed: {exc}")
                 raise
 
     @property
     def console(self):
-        if not self._console:
-            self.wait_for_console_login()
+        self.wait_for_console_login()
         return self._console
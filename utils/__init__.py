@@ -59,3 +59,25 @@ def wait_for(func, timeout=60, first=0.0, step=1.0, args=None, kwargs=None):
         time.sleep(step)
 
     return None
+
+
+def manifest_diff(base, other, path=""):
+    """
+    Get the fields of a manifest which differ from another one.
+
+    :param base: Manifest to compare with
+    :param other: Manifest to compare
+    :return: dict mapping the dotted path of every changed, added or removed field to its value in other,
+        None for removed fields
+    """
+    if isinstance(base, dict) and isinstance(other, dict):
+        diff = {}
+        for key in base.keys() | other.keys():
+            diff.update(manifest_diff(base.get(key), other.get(key), f"{path}.{key}" if path else key))
+        return diff
+    if isinstance(base, list) and isinstance(other, list) and len(base) == len(other):
+        diff = {}
+        for index, (base_item, other_item) in enumerate(zip(base, other)):
+            diff.update(manifest_diff(base_item, other_item, f"{path}.{index}"))
+        return diff
+    return {} if base == other else {path: other}
@@ -0,0 +1,108 @@
+import argparse
+import sys
+
+from utils import compare, runner
+
+
+def compare_command(args):
+    """
+    Compare the metrics of candidate runs against baseline runs.
+    """
+    results = compare.compare(
+        compare.load_metrics(args.baseline),
+        compare.load_metrics(args.candidate),
+        statistics=args.stat or ["median", "p95"],
+        threshold=args.threshold,
+    )
+    if not results:
+        print("No metrics in common between baseline and candidate", file=sys.stderr)
+        return 2
+
+    sys.stdout.write(compare.format_text(results))
+    for report_format in ("json", "junit"):
+        path = getattr(args, report_format)
+        if path:
+            with open(path, "w") as report:
+                report.write(compare.FORMATTERS[report_format](results))
+    return 1 if any(result["regression"] for result in results) else 0
+
+
+def run_command(args):
+    """
+    Run features in parallel behave processes.
+    """
+    behave_args = [f"--tags={tags}" for tags in args.tags or []]
+    behave_args += [f"-D{define}" for define in args.define or []]
+    items = runner.work_items(args.paths or [runner.ROOT / "features"], split=args.split)
+    if not items:
+        print("No features to run", file=sys.stderr)
+        return 2
+
+    parallel = runner.Runner(items, workers=args.workers, behave_args=behave_args, result_dir=args.result_dir)
+    print(f"Running {len(items)} items with {args.workers} workers, results in {parallel.result_dir}")
+    return parallel.run()
+
+
+def main(argv=None):
+    """
+    ksantt command line entry point.
+    """
+    parser = argparse.ArgumentParser(prog="ksantt", description="KubeSAN Testing Tool")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    compare_parser = subparsers.add_parser(
+        "compare",
+        help="Compare metrics of result directories and fail on regressions",
+    )
+    compare_parser.add_argument("--baseline", nargs="+", required=True, help="Baseline result directories")
+    compare_parser.add_argument("--candidate", nargs="+", required=True, help="Candidate result directories")
+    compare_parser.add_argument(
+        "--stat",
+        action="append",
+        choices=sorted(compare.STATISTICS),
+        help="Statistic to compare, may be repeated (default: median and p95)",
+    )
+    compare_parser.add_argument(
+        "--threshold",
+        type=float,
+        default=10.0,
+        help="Allowed degradation in percent (default: 10)",
+    )
+    compare_parser.add_argument("--json", metavar="PATH", help="Also write a JSON report")
+    compare_parser.add_argument("--junit", metavar="PATH", help="Also write a JUnit report")
+    compare_parser.set_defaults(func=compare_command)
+
+    run_parser = subparsers.add_parser(
+        "run",
+        help="Run features in parallel, each worker in its own namespace",
+    )
+    run_parser.add_argument("paths", nargs="*", help="Feature files or directories (default: features/)")
+    run_parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Number of behave processes running at the same time (default: 4)",
+    )
+    run_parser.add_argument(
+        "--split",
+        choices=runner.SPLITS,
+        default="feature",
+        help="Run each feature, or each scenario and scenario outline row, in its own worker (default: feature)",
+    )
+    run_parser.add_argument("--tags", action="append", help="behave tag expression, may be repeated")
+    run_parser.add_argument(
+        "-D",
+        "--define",
+        action="append",
+        metavar="NAME=VALUE",
+        help="behave userdata, e.g. -D vm.size=30Gi, may be repeated",
+    )
+    run_parser.add_argument("--result-dir", help="Run directory (default: results/ksantt-<timestamp>)")
+    run_parser.set_defaults(func=run_command)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
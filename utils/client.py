@@ -0,0 +1,123 @@
+import hashlib
+import logging
+import socket
+import threading
+from pathlib import Path
+
+import ocp_resources.resource
+import urllib3
+from kubernetes import client, config
+from kubernetes.dynamic import DynamicClient
+from urllib3.connection import HTTPConnection
+
+from utils.metrics import METRICS
+
+try:
+    from urllib3 import http2
+except ImportError:
+    http2 = None
+
+LOGGER = logging.getLogger(__name__)
+
+# Kinds followed by a watch stream in every namespace: VM, VMI, DV, PVC and VMIM, see utils.watch
+WATCHED_KINDS = 5
+DISCOVERY_CACHE_DIR = Path.home() / ".cache" / "ksantt"
+# Probe idle connections, so the pooled ones are not dropped silently by load balancers during long waits
+KEEPALIVE_OPTIONS = [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)] + [
+    (socket.IPPROTO_TCP, getattr(socket, option), value)
+    for option, value in (("TCP_KEEPIDLE", 30), ("TCP_KEEPINTVL", 10), ("TCP_KEEPCNT", 3))
+    if hasattr(socket, option)
+]
+
+_client = None
+_lock = threading.Lock()
+
+
+def _enable_http2():
+    """
+    Let urllib3 negotiate HTTP/2, if it supports it.
+
+    :return: Whether HTTP/2 is enabled
+    """
+    try:
+        if http2 is None:
+            raise ImportError(f"urllib3 {urllib3.__version__} has no HTTP/2 support")
+        http2.inject_into_urllib3()
+    except ImportError as exc:
+        LOGGER.warning(f"HTTP/2 is not available, using HTTP/1.1: {exc}")
+        return False
+    return True
+
+
+def new_client(pool_size, discovery_cache=None, use_http2=False):
+    """
+    Build a DynamicClient from the kubeconfig.
+
+    Its connection pool holds pool_size keep-alive connections to the API
+    server, so that many requests in flight reuse them instead of opening
+    and discarding connections. API discovery is read from a file cached
+    per API server, and only fetched when the file is missing or stale.
+
+    :param pool_size: Number of connections kept to the API server.
+    :param discovery_cache: Discovery cache file, per API server under DISCOVERY_CACHE_DIR by default.
+    :param use_http2: Whether to use HTTP/2 when urllib3 supports it, experimental.
+    """
+    if use_http2:
+        _enable_http2()
+    configuration = client.Configuration()
+    config.load_kube_config(client_configuration=configuration)
+    configuration.connection_pool_maxsize = pool_size
+    api_client = client.ApiClient(configuration)
+    api_client.rest_client.pool_manager.connection_pool_kw["socket_options"] = (
+        HTTPConnection.default_socket_options + KEEPALIVE_OPTIONS
+    )
+
+    if discovery_cache is None:
+        DISCOVERY_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+        host = hashlib.md5(configuration.host.encode(), usedforsecurity=False).hexdigest()
+        discovery_cache = DISCOVERY_CACHE_DIR / f"discovery-{host}.json"
+    return DynamicClient(client=api_client, cache_file=str(discovery_cache))
+
+
+def watch_connections(params):
+    """
+    Get the number of connections held by the watch streams.
+
+    Every watched kind has a stream per namespace: the namespace of the
+    feature, or every namespace of the pool, plus the namespace of the
+    golden images.
+
+    :param params: Parameters of configs.yaml, see the client and pool sections.
+    """
+    if params["client"].get("watch_connections"):
+        return int(params["client"]["watch_connections"])
+    namespaces = int(params["pool"]["size"]) if str(params["pool"]["enabled"]).lower() == "true" else 1
+    return WATCHED_KINDS * (namespaces + 1)
+
+
+def get_client(params):
+    """
+    Get the client of the process, built once.
+
+    The client is instrumented for the metrics, and every ocp_resources
+    wrapper built without a client uses it too, instead of reading the
+    kubeconfig and discovering the API again.
+
+    :param params: Parameters of configs.yaml, see the client, concurrency and pool sections.
+    """
+    global _client
+    with _lock:
+        if _client is None:
+            client_params = params["client"]
+            pool_size = client_params.get("pool_size") or (
+                int(params["concurrency"]["max_workers"]) + watch_connections(params)
+            )
+            _client = METRICS.instrument(
+                new_client(
+                    int(pool_size),
+                    discovery_cache=client_params.get("discovery_cache"),
+                    use_http2=str(client_params.get("http2", False)).lower() == "true",
+                )
+            )
+            ocp_resources.resource.get_client = lambda *args, **kwargs: _client
+        return _client
@@ -0,0 +1,230 @@
+import json
+import math
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from utils.stats import percentile
+
+HIGHER_IS_BETTER = ("iops", "bw_kib", "throughput_per_minute")
+STATISTICS = {
+    "median": lambda values: percentile(values, 50),
+    "p95": lambda values: percentile(values, 95),
+}
+
+
+def _load_benchmark(record):
+    """
+    Get the metrics of a benchmark.jsonl line.
+    """
+    for direction in ("read", "write"):
+        for field, value in record.get(direction, {}).items():
+            yield f"fio.{record['profile']}.{direction}.{field}", value
+
+
+def _load_migrations(record):
+    """
+    Get the metrics of a migrations.jsonl line.
+    """
+    if record["stats"].get("throughput_per_minute") is not None:
+        yield "migration.throughput_per_minute", record["stats"]["throughput_per_minute"]
+    for migration in record["migrations"]:
+        if migration["latency"] is not None:
+            yield "migration.latency", migration["latency"]
+        for phase, duration in migration["phase_durations"].items():
+            yield f"migration.phase.{phase}", duration
+
+
+def _load_timings(record):
+    """
+    Get the metrics of a metrics.jsonl line.
+
+    The file covers the whole run, so the metric is prefixed with the scenario
+    the step or operation ran in.
+    """
+    if record["status"] != "passed":
+        return
+    prefix = f"{record['scenario']}:" if record.get("scenario") else ""
+    # Operations run on every kind of resource, keep a slow DataVolume create apart from fast PVC creates
+    name = f"{record['name']}.{record['kind']}" if record.get("kind") else record["name"]
+    yield f"{prefix}{record['type']}.{name}.duration", record["duration"]
+    if "api_calls" in record:
+        yield f"{prefix}{record['type']}.{name}.api_calls", record["api_calls"]
+
+
+def _load_provisioning(record):
+    """
+    Get the metrics of a provisioning.jsonl line.
+    """
+    for latency in record["latencies"].values():
+        yield f"provisioning.{record['kind']}.{record['state']}", latency
+
+
+def _load_scale(record):
+    """
+    Get the metrics of a scale.jsonl line.
+    """
+    for milestone, values in record["latencies"].items():
+        for value in values:
+            yield f"scale.{record['vms']}vms.{milestone}", value
+    yield f"scale.{record['vms']}vms.api_error_rate", record["api_error_rate"]
+    yield f"scale.{record['vms']}vms.driver_error_rate", record["driver_error_rate"]
+
+
+LOADERS = {
+    "benchmark.jsonl": _load_benchmark,
+    "migrations.jsonl": _load_migrations,
+    "metrics.jsonl": _load_timings,
+    "provisioning.jsonl": _load_provisioning,
+    "scale.jsonl": _load_scale,
+}
+
+
+def expand_runs(paths):
+    """
+    Expand paths to run directories.
+
+    A path is either a run directory (results/ksantt-<timestamp>) or a
+    directory holding several of them, e.g. results/.
+    """
+    runs = []
+    for path in map(Path, paths):
+        children = sorted(child for child in path.glob("ksantt-*") if child.is_dir())
+        runs.extend(children or [path])
+    return runs
+
+
+def load_metrics(paths):
+    """
+    Load the metrics of one or more run directories.
+
+    Samples of the same scenario and metric are pooled across runs.
+
+    :return: dict mapping (scenario, metric) to a list of samples
+    """
+    metrics = {}
+    for run_dir in expand_runs(paths):
+        for path in sorted(run_dir.rglob("*.jsonl")):
+            loader = LOADERS.get(path.name)
+            if loader is None:
+                continue
+            scenario = str(path.parent.relative_to(run_dir))
+            with open(path) as metrics_file:
+                for line in metrics_file:
+                    if not line.strip():
+                        continue
+                    for metric, value in loader(json.loads(line)):
+                        metrics.setdefault((scenario, metric), []).append(value)
+    return metrics
+
+
+def compare(baseline, candidate, statistics=("median", "p95"), threshold=10.0):
+    """
+    Compare candidate metrics against baseline metrics.
+
+    A metric regresses when one of the statistics of the candidate samples is
+    worse than the same statistic of the baseline samples by more than
+    threshold percent. Worse means lower for throughput-like metrics
+    (IOPS, bandwidth) and higher for everything else (latencies, durations).
+    A metric rising from a zero baseline, e.g. an error rate, has an infinite
+    delta and regresses whatever the threshold.
+
+    :param baseline: Metrics returned by load_metrics
+    :param candidate: Metrics returned by load_metrics
+    :param statistics: Names of the statistics to compare, see STATISTICS
+    :param threshold: Allowed degradation in percent
+    :return: A list of comparison dicts, one per scenario, metric and statistic
+    """
+    results = []
+    for scenario, metric in sorted(baseline.keys() & candidate.keys()):
+        higher_is_better = metric.endswith(HIGHER_IS_BETTER)
+        base_samples = baseline[(scenario, metric)]
+        cand_samples = candidate[(scenario, metric)]
+        for statistic in statistics:
+            base = STATISTICS[statistic](base_samples)
+            cand = STATISTICS[statistic](cand_samples)
+            if base:
+                delta = (cand - base) * 100 / base
+            else:
+                delta = math.copysign(math.inf, cand) if cand else 0.0
+            regression = (-delta if higher_is_better else delta) > threshold
+            results.append(
+                {
+                    "scenario": scenario,
+                    "metric": metric,
+                    "statistic": statistic,
+                    "baseline": base,
+                    "candidate": cand,
+                    "delta_pct": delta,
+                    "regression": regression,
+                    "baseline_samples": len(base_samples),
+                    "candidate_samples": len(cand_samples),
+                }
+            )
+    return results
+
+
+def _format_delta(delta):
+    """
+    Format a delta in percent, a change from a zero baseline is infinite.
+    """
+    if math.isinf(delta):
+        return f"{'+' if delta > 0 else '-'}inf%"
+    return f"{delta:+.1f}%"
+
+
+def format_text(results):
+    """
+    Format comparison results as a text report.
+    """
+    lines = []
+    for result in results:
+        flag = "REGRESSION" if result["regression"] else "ok"
+        lines.append(
+            f"{flag:<10} {result['scenario']} {result['metric']} {result['statistic']}: "
+            f"{result['baseline']:.6g} -> {result['candidate']:.6g} ({_format_delta(result['delta_pct'])})"
+        )
+    regressions = sum(result["regression"] for result in results)
+    lines.append(f"{len(results)} comparisons, {regressions} regressions")
+    return "\n".join(lines) + "\n"
+
+
+def format_json(results):
+    """
+    Format comparison results as JSON.
+
+    JSON has no infinity, an infinite delta is written as null.
+    """
+    results = [
+        {**result, "delta_pct": None} if math.isinf(result["delta_pct"]) else result for result in results
+    ]
+    return json.dumps(results, indent=2) + "\n"
+
+
+def format_junit(results):
+    """
+    Format comparison results as a JUnit report, one testcase per comparison.
+    """
+    testsuite = ET.Element(
+        "testsuite",
+        name="ksantt-compare",
+        tests=str(len(results)),
+        failures=str(sum(result["regression"] for result in results)),
+    )
+    for result in results:
+        testcase = ET.SubElement(
+            testsuite,
+            "testcase",
+            classname=result["scenario"],
+            name=f"{result['metric']}.{result['statistic']}",
+        )
+        if result["regression"]:
+            failure = ET.SubElement(testcase, "failure", message=_format_delta(result["delta_pct"]))
+            failure.text = f"{result['baseline']:.6g} -> {result['candidate']:.6g}"
+    return ET.tostring(testsuite, encoding="unicode") + "\n"
+
+
+FORMATTERS = {
+    "text": format_text,
+    "json": format_json,
+    "junit": format_junit,
+}
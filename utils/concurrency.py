@@ -0,0 +1,50 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.exceptions import BehaveScenarioError
+
+
+def max_workers(context):
+    """
+    Get the parallelism limit configured for the steps.
+    """
+    return int(context.params["concurrency"]["max_workers"])
+
+
+def run_concurrently(context, func, objs, workers=None):
+    """
+    Run func against every object in a bounded thread pool.
+
+    Each call is given one object. Failures are collected per object and
+    raised as a single BehaveScenarioError once every call has finished.
+
+    :param context: Behave context of the running scenario
+    :param func: Callable taking one object
+    :param objs: Objects to fan out over, e.g. context.vms
+    :param workers: Parallelism limit, defaults to concurrency.max_workers
+    :return: The results of func, in the order of objs
+    """
+    objs = list(objs)
+    if not objs:
+        return []
+
+    workers = min(workers or max_workers(context), len(objs))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ksantt") as executor:
+        futures = [executor.submit(func, obj) for obj in objs]
+
+    results = []
+    failures = []
+    for obj, future in zip(objs, futures):
+        exc = future.exception()
+        if exc is None:
+            results.append(future.result())
+            continue
+        name = getattr(obj, "name", repr(obj))
+        context.logger.error(f"{name}: {exc!r}")
+        failures.append(f"{name}: {exc}")
+
+    if failures:
+        raise BehaveScenarioError(
+            context.scenario.name,
+            f"{len(failures)} of {len(objs)} operations failed: {'; '.join(failures)}",
+        )
+    return results
@@ -1,47 +1,493 @@
+import logging
+import os
+import re
+import selectors
+import threading
+import time
+from datetime import datetime
+
 import pexpect
-from timeout_sampler import TimeoutSampler
+from ocp_resources.utils.constants import TIMEOUT_10MINUTES
+from timeout_sampler import TimeoutExpiredError, TimeoutSampler
+
+from utils.metrics import METRICS
+
+LOGGER = logging.getLogger(__name__)
+
+# Boot milestones matched on the lines printed by the guest, in boot order.
+# The boot phase ending at a milestone is named after it, see ConsoleSession.boot_phases.
+BOOT_MILESTONES = (
+    ("kernel_start", r"Linux version \d"),
+    # The root filesystem only, by the initramfs on /sysroot or by the kernel without initramfs
+    ("root_mounted", r"Mounted (?:sysroot\.mount|/sysroot\.?$)|VFS: Mounted root"),
+    ("cloud_init_local", r"Cloud-init v\. \S+ running 'init-local'"),
+    ("cloud_init_network", r"Cloud-init v\. \S+ running 'init'"),
+    ("cloud_init_config", r"Cloud-init v\. \S+ running 'modules:config'"),
+    ("cloud_init_final", r"Cloud-init v\. \S+ running 'modules:final'"),
+    ("cloud_init_finished", r"Cloud-init v\. \S+ finished"),
+)
+# Time in seconds between two newlines sent to a console still waiting for the login prompt
+NUDGE_INTERVAL = 15
+# Time in seconds before a console that exited is spawned again, e.g. while the VMI is not running yet.
+# Kept short so that little of the boot is missed when the console is attached before the VM starts.
+RESPAWN_INTERVAL = 2
+# Time in seconds to wait for the multiplexer to release a detached session
+DETACH_TIMEOUT = 30
+READ_SIZE = 4096
+# Output kept to match prompts split over several reads
+MATCH_WINDOW = 4096
+
+
+class ConsoleSession:
+    """
+    Login in progress on the serial console of one VM, driven by the ConsoleMultiplexer.
+
+    The session goes through the login prompt, then the shell prompt, and is
+    ready once the shell prompt shows up. Everything the guest prints until
+    then is written to log_path, one line per line of output, prefixed with
+    the time it was read. Boot milestones found in those lines are recorded
+    in milestones, in seconds since the session was attached.
+    """
+
+    def __init__(self, console, timeout, log_path=None):
+        """
+        Initialize a ConsoleSession.
+
+        :param console: Console to log in with.
+        :param timeout: Time in seconds the login may take.
+        :param log_path: File to capture the console output to, None to not capture it.
+        """
+        self.console = console
+        self.child = None
+        self.start = time.monotonic()
+        self.deadline = self.start + timeout
+        self.state = "login"
+        self.milestones = {}
+        self.error = None
+        self.ready = threading.Event()
+        self.next_nudge = self.start
+        self.next_spawn = self.start
+        self._buffer = ""
+        self._line = ""
+        self._patterns = [(name, re.compile(pattern)) for name, pattern in BOOT_MILESTONES]
+        self._login = re.compile(console.login_prompt)
+        self._prompt = re.compile("|".join(console.prompt))
+        self._log = None
+        if log_path:
+            log_path.parent.mkdir(mode=0o755, parents=True, exist_ok=True)
+            self._log = open(log_path, "a", buffering=1)
+
+    @property
+    def name(self):
+        return self.console.vm.name
+
+    def _milestone(self, name):
+        self.milestones[name] = time.monotonic() - self.start
+        self.console.vm.logger.info(f"{self.name}: console reached {name} after {self.milestones[name]:.1f}s")
+
+    def _capture(self, line):
+        """
+        Write a line of output to the log and match the boot milestones.
+        """
+        if self._log:
+            self._log.write(f"{datetime.now().isoformat()} +{time.monotonic() - self.start:8.3f} {line}\n")
+        for milestone, pattern in self._patterns:
+            if pattern.search(line):
+                self._milestone(milestone)
+                self._patterns.remove((milestone, pattern))
+                break
+
+    def feed(self, data):
+        """
+        Capture the console output, match it and answer the prompts.
+
+        The session is done once the shell prompt shows up, the multiplexer then signals ready.
+        """
+        *lines, self._line = (self._line + data.replace("\r", "")).split("\n")
+        for line in lines:
+            self._capture(line)
+        self._line = self._line[-MATCH_WINDOW:]
+        self._buffer = (self._buffer + data)[-MATCH_WINDOW:]
+        if self.state == "login" and (match := self._login.search(self._buffer)):
+            self._buffer = self._buffer[match.end() :]
+            self._milestone("login_prompt")
+            self.console.vm.logger.info(f"{self.name}: Using username {self.console.username}")
+            self.child.sendline(self.console.username)
+            if self.console.password:
+                self.child.sendline(self.console.password)
+            self.state = "prompt"
+        if self.state == "prompt" and self._prompt.search(self._buffer):
+            self._milestone("shell_prompt")
+            self.state = "ready"
+
+    @property
+    def done(self):
+        return self.state in ("ready", "failed")
+
+    def fail(self, error):
+        """
+        Give up on the login.
+        """
+        self.error = error
+        self.state = "failed"
+
+    def boot_phases(self):
+        """
+        Get the duration of the boot phases reached.
+
+        Each phase ends at a milestone and is named after it. It starts at
+        the previous milestone reached, or at the attach for the first one,
+        so the first phase also covers scheduling the VMI and connecting to
+        its console. login_prompt ends the last phase.
+
+        :return: dict mapping each phase to its duration in seconds
+        """
+        phases = {}
+        previous = 0.0
+        for milestone in [name for name, _ in BOOT_MILESTONES] + ["login_prompt"]:
+            if milestone in self.milestones:
+                phases[milestone] = self.milestones[milestone] - previous
+                previous = self.milestones[milestone]
+        return phases
+
+    def close(self):
+        """
+        Stop capturing and record the boot phases in the run metrics.
+
+        Only a ready session records its phases. A failed, timed out or
+        detached one records its total time as failed, so partial boots do
+        not end up among the boot timings.
+        """
+        if self._log:
+            if self._line:
+                self._capture(self._line)
+            self._log.close()
+            self._log = None
+        if self.state != "ready":
+            METRICS.record(
+                "boot",
+                "total",
+                vm=self.name,
+                duration=time.monotonic() - self.start,
+                status="failed",
+                error=self.error,
+            )
+            return
+        for phase, duration in self.boot_phases().items():
+            METRICS.record("boot", phase, vm=self.name, duration=duration, status="passed")
+        if "kernel_start" in self.milestones and "login_prompt" in self.milestones:
+            METRICS.record(
+                "boot",
+                "total",
+                vm=self.name,
+                duration=self.milestones["login_prompt"] - self.milestones["kernel_start"],
+                status="passed",
+            )
+
+    def wait(self, timeout=None):
+        """
+        Wait until the shell prompt shows up.
+
+        :param timeout: Time to wait in seconds, until the deadline of the session by default
+        :return: The pexpect child of the console
+        :raises TimeoutExpiredError: If the login fails or times out
+        """
+        self.ready.wait(timeout if timeout is not None else max(self.deadline - time.monotonic(), 0) + 1)
+        if self.state != "ready":
+            raise TimeoutExpiredError(
+                f"Console login of {self.name}: {self.error or f'waiting for {self.state}'}",
+                elapsed_time=time.monotonic() - self.start,
+            )
+        return self.child
+
+
+class ConsoleMultiplexer:
+    """
+    Log in on the serial consoles of many VMs from a single thread.
+
+    Every console is a virtctl console child process. Their file descriptors
+    are watched with a selector, the output of each one is matched against
+    the prompt it is waiting for as soon as it is read, and the session is
+    marked ready when its shell prompt shows up. Waiting for 50 consoles thus
+    costs about as much as waiting for the slowest one, and no thread is
+    blocked in expect() per console. Once ready, the child is handed over to
+    the Console and no longer read by the multiplexer.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self):
+        """
+        Initialize the multiplexer, its thread is started on first attach.
+        """
+        self._selector = selectors.DefaultSelector()
+        self._sessions = []
+        self._lock = threading.Lock()
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        os.set_blocking(self._wakeup_r, False)
+        self._selector.register(self._wakeup_r, selectors.EVENT_READ)
+        self._thread = None
+
+    @classmethod
+    def shared(cls):
+        """
+        Get the multiplexer shared by every console of the process.
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def attach(self, console, timeout=TIMEOUT_10MINUTES, log_path=None):
+        """
+        Start logging in on a console.
+
+        :param console: Console to log in with.
+        :param timeout: Time in seconds the login may take.
+        :param log_path: File to capture the console output to until the login, None to not capture it.
+        :return: The ConsoleSession, wait() on it for the login to finish.
+        """
+        session = ConsoleSession(console, timeout, log_path=log_path)
+        with self._lock:
+            self._sessions.append(session)
+        self._wakeup()
+        return session
+
+    def _wakeup(self):
+        """
+        Wake up the thread, starting it again if it is not running.
+        """
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="ksantt-console", daemon=True)
+                self._thread.start()
+        os.write(self._wakeup_w, b"\0")
+
+    def detach(self, session):
+        """
+        Give up on a session, e.g. because its VM is deleted.
+        """
+        if not session.done:
+            session.fail("detached")
+            self._wakeup()
+
+    def _spawn(self, session):
+        """
+        Spawn the virtctl console of a session.
+        """
+        session.console.vm.logger.info(f"Connect to {session.name} console")
+        session.child = pexpect.spawn(session.console.cmd, timeout=session.console.timeout, encoding="utf-8")
+        # The default delay before each send would stall every other console
+        session.child.delaybeforesend = None
+        self._selector.register(session.child.child_fd, selectors.EVENT_READ, session)
+        session.child.send("\n\n")
+        session.next_nudge = time.monotonic() + NUDGE_INTERVAL
+
+    def _close(self, session, terminate=False):
+        """
+        Stop reading the console of a session.
+        """
+        if session.child is None:
+            return
+        try:
+            self._selector.unregister(session.child.child_fd)
+        except (KeyError, ValueError):
+            pass
+        if terminate:
+            try:
+                session.child.close(force=True)
+            except Exception as exc:
+                LOGGER.debug(f"Failed to close console of {session.name}: {exc!r}")
+            session.child = None
+
+    def _read(self, session):
+        """
+        Read the pending output of a session.
+        """
+        try:
+            session.feed(session.child.read_nonblocking(READ_SIZE, timeout=0))
+        except pexpect.TIMEOUT:
+            return
+        except (pexpect.EOF, UnicodeDecodeError) as exc:
+            # virtctl console exits while the VMI is not running yet, try again later
+            LOGGER.debug(f"Console of {session.name} closed: {exc!r}")
+            self._close(session, terminate=True)
+            session.next_spawn = time.monotonic() + RESPAWN_INTERVAL
+
+    def _finish(self, session):
+        """
+        Stop driving a done session and wake up its waiter.
+
+        The child of a ready session is handed over to the Console, it is
+        only unregistered so the multiplexer does not read it anymore.
+        """
+        try:
+            self._close(session, terminate=session.state != "ready")
+            with self._lock:
+                if session in self._sessions:
+                    self._sessions.remove(session)
+            session.close()
+        except Exception as exc:
+            LOGGER.warning(f"Failed to finish console session of {session.name}: {exc!r}")
+        finally:
+            session.ready.set()
+
+    def _tick(self, session, now):
+        """
+        Spawn, nudge or expire a session.
+
+        A session whose console fails, e.g. on a dead pty, is failed instead
+        of taking down the thread driving every other session.
+
+        :return: Time of the next action the session needs
+        """
+        if session.done:
+            return None
+        if now >= session.deadline:
+            session.fail(f"timed out waiting for {session.state}")
+            return None
+        try:
+            if session.child is None and now >= session.next_spawn:
+                try:
+                    self._spawn(session)
+                except pexpect.ExceptionPexpect as exc:
+                    self._close(session, terminate=True)
+                    session.next_spawn = now + RESPAWN_INTERVAL
+                    LOGGER.debug(f"Failed to spawn console of {session.name}: {exc}")
+            if session.child is not None and session.state == "login" and now >= session.next_nudge:
+                session.child.send("\n")
+                session.next_nudge = now + NUDGE_INTERVAL
+        except Exception as exc:
+            session.fail(f"console failed: {exc!r}")
+            return None
+        wake = session.deadline
+        if session.child is None:
+            wake = min(wake, session.next_spawn)
+        elif session.state == "login":
+            wake = min(wake, session.next_nudge)
+        return wake
+
+    def _run(self):
+        """
+        Drive every attached session until it is ready or failed.
+        """
+        while True:
+            try:
+                self._loop()
+            except Exception as exc:
+                # Unexpected, fail the sessions rather than leaving their waiters to run out their deadline
+                LOGGER.error(f"Console multiplexer failed: {exc!r}")
+                with self._lock:
+                    sessions = list(self._sessions)
+                for session in sessions:
+                    session.fail(f"console multiplexer failed: {exc!r}")
+                    self._finish(session)
+                time.sleep(1)
+
+    def _loop(self):
+        """
+        Drive the sessions once, waiting for their output or their next action.
+        """
+        now = time.monotonic()
+        with self._lock:
+            sessions = list(self._sessions)
+        wakes = []
+        for session in sessions:
+            wake = self._tick(session, now)
+            if session.done:
+                self._finish(session)
+            else:
+                wakes.append(wake)
+
+        timeout = max(min(wakes) - time.monotonic(), 0) if wakes else None
+        for key, _ in self._selector.select(timeout):
+            if key.fd == self._wakeup_r:
+                while True:
+                    try:
+                        if not os.read(self._wakeup_r, READ_SIZE):
+                            break
+                    except BlockingIOError:
+                        break
+                continue
+            session = key.data
+            try:
+                self._read(session)
+            except Exception as exc:
+                session.fail(str(exc))
+            if session.done:
+                self._finish(session)
 
 
 class Console(object):
-    def __init__(self, vm, username=None, password=None, timeout=30, prompt=None):
+    def __init__(
+        self,
+        vm,
+        username=None,
+        password=None,
+        timeout=30,
+        prompt=None,
+        login_timeout=TIMEOUT_10MINUTES,
+        log_path=None,
+    ):
         """
         Initialize a VM console connection.
+
+        :param timeout: Timeout of the pexpect child, in seconds.
+        :param login_timeout: Time in seconds the VM may take to boot and log in.
+        :param log_path: File to capture the boot output to, None to not capture it.
         """
         self.vm = vm
         self.username = username or self.vm.username
         self.password = password or self.vm.password
         self.timeout = timeout
+        self.login_timeout = login_timeout
+        self.log_path = log_path
         self.child = None
+        self.session = None
         self.login_prompt = "login:"
         self.prompt = prompt if prompt else [r"\$"]
         self.cmd = self._generate_cmd()
 
-    def connect(self):
+    def attach(self):
         """
-        Connect to the VM console.
+        Start logging in on the VM console in the background, unless it is in progress already.
+
+        Attaching before the VM starts captures its whole boot.
         """
-        self.vm.logger.info(f"Connect to {self.vm.name} console")
-        self.console_eof_sampler(func=pexpect.spawn, command=self.cmd, timeout=self.timeout)
+        if self.session is None or self.session.state == "failed":
+            self.session = ConsoleMultiplexer.shared().attach(self, timeout=self.login_timeout, log_path=self.log_path)
+        return self.session
 
-        self._connect()
+    def connect(self):
+        """
+        Connect to the VM console.
 
+        The login is driven by the shared ConsoleMultiplexer, this only waits for it.
+        """
+        self.child = self.attach().wait()
+        self.vm.logger.info(f"{self.vm.name}: Got prompt {self.prompt}")
         return self.child
 
-    def _connect(self):
+    def close(self):
         """
-        Handle login sequence for VM console connection.
-        Note: cirros and alpine have some problem with password prompt.
+        Stop the console without logging out, e.g. before its VM is deleted.
+
+        The console child of the session is closed whether connect() took it
+        or not, the multiplexer only closes the children of sessions that are
+        not ready.
         """
-        self.child.send("\n\n")
-        self.child.expect(self.login_prompt, timeout=360)
-        self.vm.logger.info(f"{self.vm.name}: Using username {self.username}")
-        self.child.sendline(self.username)
-        if self.password:
-            self.vm.logger.info(f"{self.vm.name}: Using password {self.password}")
-            self.child.sendline(self.password)
-
-        self.child.expect(self.prompt, timeout=150)
-        self.vm.logger.info(f"{self.vm.name}: Got prompt {self.prompt}")
+        if self.session is not None:
+            ConsoleMultiplexer.shared().detach(self.session)
+            if not self.session.ready.wait(DETACH_TIMEOUT):
+                self.vm.logger.warning(f"{self.vm.name}: console session not released after {DETACH_TIMEOUT}s")
+            elif self.session.child is not None and self.session.child is not self.child:
+                # A ready session hands its child over even if connect() never took it
+                self.session.child.close(force=True)
+                self.session.child = None
+        if self.child is not None:
+            self.child.close(force=True)
+            self.child = None
 
     def disconnect(self):
         """
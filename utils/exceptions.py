@@ -52,3 +52,26 @@ class BehaveStepError(BehaveError):
         Initialize a BehaveStepError.
         """
         super().__init__(bdd_type="Step", name=name, reason=reason)
+
+
+class ApplyError(Exception):
+    """
+    Exception for an object which failed to apply.
+    """
+
+    def __init__(self, kind: str, name: str, conflict: bool, reason: str):
+        """
+        Initialize an ApplyError.
+
+        :param conflict: Whether another field manager owns fields of the object.
+        """
+        self.kind = kind
+        self.name = name
+        self.conflict = conflict
+        self.reason = reason
+
+    def __str__(self):
+        """
+        Return a string representation of the error.
+        """
+        return f"{self.kind} '{self.name}' {'conflicts' if self.conflict else 'failed to apply'}: {self.reason}"
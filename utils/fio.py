@@ -0,0 +1,78 @@
+import json
+
+FIO_PERCENTILES = ("50.000000", "95.000000", "99.000000", "99.900000")
+
+
+def fio_command(name, filename, runtime, size, ioengine="libaio", **options):
+    """
+    Build a fio command line with JSON output.
+
+    :param name: Name of the fio job
+    :param filename: Device or file to run the job against
+    :param runtime: Time to run the job in seconds
+    :param size: Size of the region to do I/O on
+    :param ioengine: fio I/O engine
+    :param options: Extra fio options, e.g. rw="randread", bs="4k"
+    """
+    args = [
+        "fio",
+        f"--name={name}",
+        f"--filename={filename}",
+        f"--ioengine={ioengine}",
+        "--direct=1",
+        "--time_based",
+        f"--runtime={runtime}",
+        f"--size={size}",
+        "--group_reporting",
+        "--output-format=json",
+    ]
+    args += [f"--{key}={value}" for key, value in options.items()]
+    return " ".join(args)
+
+
+def _summarize_io(io):
+    """
+    Summarize the read or write section of a fio job.
+    """
+    clat = io.get("clat_ns", {})
+    percentiles = clat.get("percentile", {})
+    summary = {
+        "iops": io.get("iops", 0.0),
+        "bw_kib": io.get("bw", 0),
+        "lat_mean_us": io.get("lat_ns", {}).get("mean", 0.0) / 1000,
+    }
+    for percentile in FIO_PERCENTILES:
+        if percentile in percentiles:
+            summary[f"clat_p{float(percentile):g}_us"] = percentiles[percentile] / 1000
+    return summary
+
+
+def parse_fio_result(output):
+    """
+    Parse the JSON output of fio into IOPS, bandwidth and latency percentiles.
+
+    :param output: Standard output of fio --output-format=json
+    :return: dict with a summary per I/O direction that did any I/O
+
+    fio may print notes before the JSON document, they are skipped:
+
+    >>> output = (
+    ...     "note: both iodepth >= 1 and synchronous I/O engine are selected, queue depth will be capped at 1\\n"
+    ...     '{"fio version": "fio-3.35", "jobs": [{"jobname": "rand_read", "error": 0,'
+    ...     ' "read": {"io_bytes": 409600, "bw": 4002, "iops": 1000.5, "total_ios": 100,'
+    ...     ' "clat_ns": {"mean": 940000.0, "percentile": {"1.000000": 501760, "50.000000": 880640,'
+    ...     ' "95.000000": 1286144, "99.000000": 2039808, "99.900000": 4489216}},'
+    ...     ' "lat_ns": {"min": 420000, "max": 5000000, "mean": 950000.0}},'
+    ...     ' "write": {"io_bytes": 0, "bw": 0, "iops": 0.0, "total_ios": 0}}]}'
+    ... )
+    >>> parse_fio_result(output)  # doctest: +NORMALIZE_WHITESPACE
+    {'read': {'iops': 1000.5, 'bw_kib': 4002, 'lat_mean_us': 950.0, 'clat_p50_us': 880.64,
+              'clat_p95_us': 1286.144, 'clat_p99_us': 2039.808, 'clat_p99.9_us': 4489.216}}
+    """
+    result = json.loads(output[output.index("{") :])
+    job = result["jobs"][0]
+    summary = {}
+    for direction in ("read", "write"):
+        if job.get(direction, {}).get("total_ios"):
+            summary[direction] = _summarize_io(job[direction])
+    return summary
@@ -1,7 +1,13 @@
+import hashlib
+import json
+import os
 import platform
+import shutil
+import tarfile
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from tarfile import TarFile
-from tempfile import TemporaryDirectory
 from urllib.parse import urlparse
 from zipfile import ZipFile
 
@@ -9,8 +15,18 @@ import requests
 import urllib3
 from kubernetes.dynamic import DynamicClient
 from kubernetes.dynamic.exceptions import ResourceNotFoundError
+from ocp_resources.cluster_version import ClusterVersion
 from ocp_resources.console_cli_download import ConsoleCLIDownload
 
+BINARY_MAP = {
+    "helm": "helm-download-links",
+    "oc": "oc-cli-downloads",
+    "virtctl": "virtctl-clidownloads-kubevirt-hyperconverged",
+}
+BUFFER_SIZE = 1024 * 1024
+CACHE_DIR = Path(os.getenv("KSANTT_CACHE_DIR", Path.home() / ".cache" / "ksantt" / "bin"))
+HTTP_NOT_MODIFIED = 304
+
 
 def get_console_spec_links(client: DynamicClient, name: str):
     """
@@ -22,40 +38,213 @@ def get_console_spec_links(client: DynamicClient, name: str):
     raise ResourceNotFoundError(f"{name} ConsoleCLIDownload not found")
 
 
-def extract_binary_from_cluster(client, name):
+def get_cluster_version(client: DynamicClient):
+    """
+    Get the OpenShift version of the cluster.
+    """
+    return ClusterVersion(client=client, name="version").instance.status.desired.version
+
+
+def sha256sum(path):
     """
-    Download binary from cluster and extract it to /usr/local/bin/.
+    Get the SHA-256 digest of a file.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        while chunk := file.read(BUFFER_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class BinaryCache:
+    """
+    Content-addressed cache of the CLI binaries served by a cluster.
+
+    Binaries are stored once under blobs/<sha256>. index.json maps a key,
+    made of the cluster version and the download URL, to the digest of the
+    binary and to the ETag and Last-Modified headers it was served with.
+
+    A cached binary is only used after its digest was checked. If the server
+    sent validators, it is revalidated with a conditional request, which costs
+    a round trip but no download. Archives are extracted while they are
+    downloaded, without writing the archive to disk, except for zip archives
+    which cannot be read as a stream.
     """
-    dst_path = Path("/usr/local/bin")
-    binary_map = {
-        "helm": "helm-download-links",
-        "oc": "oc-cli-downloads",
-        "virtctl": "virtctl-clidownloads-kubevirt-hyperconverged",
-    }
 
-    console_cli_links = get_console_spec_links(client, binary_map[name])
-    download_urls = [entry["href"] for entry in console_cli_links]
+    def __init__(self, path=CACHE_DIR):
+        """
+        Initialize the cache.
+
+        :param path: Cache directory, $KSANTT_CACHE_DIR or ~/.cache/ksantt/bin by default
+        """
+        self.path = Path(path)
+        self.blobs = self.path / "blobs"
+        self.blobs.mkdir(mode=0o755, parents=True, exist_ok=True)
+        self._index_file = self.path / "index.json"
+        self._lock = threading.Lock()
+
+    def _read_index(self):
+        try:
+            with open(self._index_file) as index:
+                return json.load(index)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _update_index(self, key, entry):
+        """
+        Add an entry to the index, replacing the file atomically.
+        """
+        with self._lock:
+            index = self._read_index()
+            index[key] = entry
+            with tempfile.NamedTemporaryFile("w", dir=self.path, delete=False) as tmp:
+                json.dump(index, tmp, indent=2)
+            os.replace(tmp.name, self._index_file)
+
+    def _cached(self, key):
+        """
+        Get the index entry of key, if its blob is intact.
+        """
+        entry = self._read_index().get(key)
+        if not entry:
+            return None
+        blob = self.blobs / entry["sha256"]
+        if not blob.exists() or sha256sum(blob) != entry["sha256"]:
+            blob.unlink(missing_ok=True)
+            return None
+        return entry
+
+    def _store(self, src):
+        """
+        Copy a file object into the cache.
+
+        :return: The SHA-256 digest of the content
+        """
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=self.blobs, delete=False) as tmp:
+            while chunk := src.read(BUFFER_SIZE):
+                digest.update(chunk)
+                tmp.write(chunk)
+        blob = self.blobs / digest.hexdigest()
+        os.chmod(tmp.name, 0o755)
+        os.replace(tmp.name, blob)
+        return digest.hexdigest()
+
+    def _download(self, response, name, filename):
+        """
+        Store the binary name from a download response.
+        """
+        response.raw.decode_content = True
+        if filename.endswith((".tar.gz", ".tgz", ".tar")):
+            with tarfile.open(fileobj=response.raw, mode="r|*", bufsize=BUFFER_SIZE) as archive:
+                for member in archive:
+                    if member.isfile() and Path(member.name).name == name:
+                        return self._store(archive.extractfile(member))
+            raise FileNotFoundError(f"{name} not found in {filename}")
+        if filename.endswith(".zip"):
+            with tempfile.TemporaryFile() as tmp:
+                shutil.copyfileobj(response.raw, tmp, BUFFER_SIZE)
+                with ZipFile(tmp) as archive:
+                    with archive.open(name) as binary:
+                        return self._store(binary)
+        return self._store(response.raw)
+
+    def fetch(self, url, name, version):
+        """
+        Get the binary name from url, from the cache when it is still current.
+
+        :param url: Download URL of the binary or of an archive holding it
+        :param name: Name of the binary
+        :param version: Cluster version, part of the cache key
+        :return: Path of the cached binary
+        """
+        key = hashlib.sha256(f"{version}\n{url}".encode()).hexdigest()
+        entry = self._cached(key)
+        if entry and not (entry.get("etag") or entry.get("last_modified")):
+            return self.blobs / entry["sha256"]
+
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        with requests.get(url, headers=headers, verify=False, stream=True) as response:
+            if entry and response.status_code == HTTP_NOT_MODIFIED:
+                return self.blobs / entry["sha256"]
+            response.raise_for_status()
+            digest = self._download(response, name, Path(urlparse(url).path).name)
+            self._update_index(
+                key,
+                {
+                    "url": url,
+                    "version": version,
+                    "sha256": digest,
+                    "etag": response.headers.get("ETag"),
+                    "last_modified": response.headers.get("Last-Modified"),
+                },
+            )
+        return self.blobs / digest
+
+
+def get_download_url(client, name):
+    """
+    Get the download URL of a binary for this platform.
+    """
     os_system = platform.system().lower()
     os_system = "mac" if os_system == "darwin" and platform.mac_ver()[0] else os_system
     os_machine = "amd64" if (machine := platform.machine()) == "x86_64" else machine
+    for entry in get_console_spec_links(client, BINARY_MAP[name]):
+        if os_system in entry["href"] and os_machine in entry["href"]:
+            return entry["href"]
+    raise ResourceNotFoundError(f"No {name} download for {os_system}/{os_machine}")
+
+
+def install_binary(src, dst):
+    """
+    Install a binary, unless dst already has the same content.
+    """
+    if dst.exists() and sha256sum(dst) == src.name:
+        return dst
+    dst.parent.mkdir(mode=0o755, parents=True, exist_ok=True)
+    with tempfile.NamedTemporaryFile(dir=dst.parent, delete=False) as tmp:
+        with open(src, "rb") as binary:
+            shutil.copyfileobj(binary, tmp, BUFFER_SIZE)
+    os.chmod(tmp.name, 0o755)
+    os.replace(tmp.name, dst)
+    return dst
+
+
+def extract_binary_from_cluster(client, name, dst_path="/usr/local/bin", cache=None, version=None):
+    """
+    Download binary from cluster, through the binary cache, and install it to dst_path.
+
+    :param name: helm, oc or virtctl
+    :param dst_path: Directory to install the binary to
+    :param cache: BinaryCache to use, the default cache if None
+    :param version: Cluster version, looked up if None
+    """
     # FIXME: Remove SSL warning
     urllib3.disable_warnings()
-    for url in download_urls:
-        if os_system in url and os_machine in url:
-            download_url = url
-            break
-    with TemporaryDirectory() as temp_dir:
-        filename = Path(urlparse(download_url).path).name
-        local_filename = Path(temp_dir) / filename
-        with requests.get(url, verify=False, stream=True) as created_request:
-            created_request.raise_for_status()
-            with open(local_filename, "wb") as file:
-                for chunk in created_request.iter_content(chunk_size=8192):
-                    file.write(chunk)
-        archive_file = ZipFile(local_filename) if local_filename.suffix == ".zip" else TarFile(local_filename)
-        archive_file.extract(name, dst_path)
-
-    return dst_path / name
+    cache = cache or BinaryCache()
+    version = version or get_cluster_version(client)
+    blob = cache.fetch(get_download_url(client, name), name, version)
+    return install_binary(blob, Path(dst_path) / name)
+
+
+def extract_binaries_from_cluster(client, names=tuple(BINARY_MAP), dst_path="/usr/local/bin"):
+    """
+    Download several binaries from cluster at the same time.
+
+    :return: dict mapping each name to the path of its binary
+    """
+    cache = BinaryCache()
+    version = get_cluster_version(client)
+    with ThreadPoolExecutor(max_workers=len(names), thread_name_prefix="ksantt") as executor:
+        paths = executor.map(
+            lambda name: extract_binary_from_cluster(client, name, dst_path, cache=cache, version=version),
+            names,
+        )
+        return dict(zip(names, paths))
 
 
 def extract_helm_binary(client):
@@ -0,0 +1,185 @@
+import gzip
+import json
+import logging
+import threading
+from pathlib import Path
+
+LOGGER = logging.getLogger(__name__)
+MiB = 1024 * 1024
+
+
+class LogShipper:
+    """
+    Ship a growing log file in compressed chunks while it is written.
+
+    A thread tails the file and hands every chunk_size bytes, cut at a line
+    boundary, gzipped to send. What is left is shipped by close().
+
+    At most max_size bytes are shipped. Once the head of the file used up
+    max_size - tail_size, the shipper stops and close() only ships the last
+    tail_size bytes of the file, so both the start and the end of a long log
+    are uploaded. The head and the tail are both cut at line boundaries.
+    The skipped byte range is recorded; the file itself is left untouched.
+
+    The index, written next to the file as <name>.index.json, maps every
+    step to the byte range it logged and every uploaded chunk to the byte
+    range it holds. Chunks that failed to upload are listed apart.
+    """
+
+    def __init__(self, path, send=None, chunk_size=MiB, max_size=20 * MiB, tail_size=2 * MiB, interval=5):
+        """
+        Initialize the shipper and start tailing path.
+
+        :param path: Log file, it does not have to exist yet
+        :param send: Callable(name, data, start, end) uploading a gzipped chunk, None to only index the file
+        :param chunk_size: Size in bytes of the chunks
+        :param max_size: Maximum number of bytes to ship
+        :param tail_size: Number of bytes at the end of the file shipped in any case
+        :param interval: Time in seconds between two looks at the file
+        """
+        self.path = Path(path)
+        self.send = send
+        self.chunk_size = chunk_size
+        self.max_size = max_size
+        self.tail_size = min(tail_size, max_size)
+        self.interval = interval
+        self.chunks = []
+        self.steps = []
+        self.skipped = []
+        self.failed = []
+        self._offset = 0
+        self._shipped = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"ksantt-log-{self.path.name}", daemon=True)
+        if self.send:
+            self._thread.start()
+
+    def _size(self):
+        """
+        Get the size of the file, 0 if it does not exist yet.
+        """
+        try:
+            return self.path.stat().st_size
+        except FileNotFoundError:
+            return 0
+
+    def _read(self, offset, length):
+        """
+        Read length bytes of the file from offset.
+        """
+        with open(self.path, "rb") as log_file:
+            log_file.seek(offset)
+            return log_file.read(length)
+
+    def _ship_chunk(self, data):
+        """
+        Ship data, the bytes of the file from the current offset.
+
+        A chunk that fails to upload is recorded in failed instead of chunks,
+        the shipper carries on with the next one.
+        """
+        start, end = self._offset, self._offset + len(data)
+        name = f"{self.path.name}.{len(self.chunks) + len(self.failed):03d}.gz"
+        try:
+            self.send(name, gzip.compress(data), start, end)
+        except Exception as exc:
+            LOGGER.warning(f"Failed to ship {name}: {exc}")
+            self.failed.append({"name": name, "start": start, "end": end})
+        else:
+            self.chunks.append({"name": name, "start": start, "end": end})
+        self._offset = end
+        self._shipped += len(data)
+
+    def _tail_start(self, size):
+        """
+        Get the offset of the first line starting in the last tail_size bytes of the file.
+        """
+        tail_start = size - self.tail_size
+        if tail_start <= 0:
+            return 0
+        newline = self._read(tail_start - 1, self.tail_size).find(b"\n")
+        return tail_start + newline if newline >= 0 else tail_start
+
+    def _ship(self, final=False):
+        """
+        Ship the chunks that are complete, or everything that is left if final.
+        """
+        with self._lock:
+            size = self._size()
+            if size < self._offset:
+                # The file was rotated, continue with the new one
+                self._offset = 0
+            while self._offset < size:
+                left = size - self._offset
+                room = self.max_size - self.tail_size - self._shipped
+                if room <= 0:
+                    if not final:
+                        return
+                    tail_start = max(self._offset, self._tail_start(size))
+                    if tail_start > self._offset:
+                        self.skipped.append({"start": self._offset, "end": tail_start})
+                        self._offset = tail_start
+                    left = room = size - self._offset
+                    if not left:
+                        return
+                length = min(self.chunk_size, room, left)
+                if length == left < self.chunk_size and not final:
+                    return
+                data = self._read(self._offset, length)
+                if not data:
+                    # Truncated or rotated since it was stat'ed, stat it again on the next call
+                    return
+                if self._offset + len(data) < size:
+                    cut = data.rfind(b"\n") + 1
+                    if cut:
+                        data = data[:cut]
+                    elif length == room:
+                        # Not even one more line fits in the head, leave the rest to the tail
+                        self._shipped = self.max_size - self.tail_size
+                        continue
+                self._ship_chunk(data)
+
+    def _run(self):
+        """
+        Tail the file until close().
+        """
+        while not self._stop.wait(self.interval):
+            self._ship()
+
+    def begin_step(self, name):
+        """
+        Mark the start of a step in the index.
+        """
+        self.steps.append({"step": name, "start": self._size(), "end": None, "status": None})
+
+    def end_step(self, status):
+        """
+        Mark the end of the current step in the index.
+        """
+        if self.steps:
+            self.steps[-1].update(end=self._size(), status=status)
+
+    def close(self):
+        """
+        Ship what is left and write the index.
+
+        :return: The index
+        """
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        if self.send:
+            self._ship(final=True)
+        index = {
+            "file": self.path.name,
+            "size": self._size(),
+            "shipped": sum(chunk["end"] - chunk["start"] for chunk in self.chunks),
+            "skipped": self.skipped,
+            "failed": self.failed,
+            "chunks": self.chunks,
+            "steps": self.steps,
+        }
+        with open(self.path.with_name(f"{self.path.name}.index.json"), "w") as index_file:
+            json.dump(index, index_file, indent=2)
+        return index
@@ -0,0 +1,170 @@
+import functools
+import json
+import threading
+import time
+from contextlib import contextmanager
+
+HTTP_TOO_MANY_REQUESTS = 429
+HTTP_SERVER_ERROR = 500
+
+
+class Metrics:
+    """
+    Record the wall-clock time and the API calls of steps and operations.
+
+    Every record is appended to a JSON lines file as soon as it is complete:
+
+        {"type": "operation", "name": "create", "start": ..., "duration": ...,
+         "api_calls": ..., "status": "passed", "scenario": ..., "kind": ..., "resource": ...}
+
+    API calls are counted on the ApiClient of an instrumented DynamicClient.
+    An operation counts the calls made by its own thread while it runs, a
+    step counts every call made while it runs, including the ones of worker
+    and watch threads.
+    """
+
+    def __init__(self):
+        """
+        Initialize an empty recorder, records are dropped until open() is called.
+        """
+        self.labels = {}
+        self._file = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._api_calls = 0
+        self._api_errors = 0
+
+    def open(self, path):
+        """
+        Start writing records to path.
+        """
+        self._file = open(path, "a", buffering=1)
+
+    def close(self):
+        """
+        Stop writing records.
+        """
+        with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def instrument(self, client):
+        """
+        Count the API calls of a DynamicClient.
+
+        Every verb of the DynamicClient, watches and subresource requests such
+        as VM start all end up in ApiClient.request.
+        """
+        api_client = client.client
+        request = api_client.request
+
+        @functools.wraps(request)
+        def counted_request(*args, **kwargs):
+            with self._lock:
+                self._api_calls += 1
+            for frame in self._stack():
+                frame["api_calls"] += 1
+            try:
+                return request(*args, **kwargs)
+            except Exception as exc:
+                # Client errors such as 404 on existence checks are expected, only count server side failures
+                status = getattr(exc, "status", None)
+                if not status or status >= HTTP_SERVER_ERROR or status == HTTP_TOO_MANY_REQUESTS:
+                    with self._lock:
+                        self._api_errors += 1
+                raise
+
+        api_client.request = counted_request
+        return client
+
+    def api_counters(self):
+        """
+        Get the number of API calls and of failed API calls so far.
+
+        A call failed when the API server answered 5xx or 429, or did not answer.
+        """
+        return self._api_calls, self._api_errors
+
+    def _stack(self):
+        """
+        Get the operations running in the current thread.
+        """
+        return self._local.__dict__.setdefault("stack", [])
+
+    def begin(self):
+        """
+        Start measuring a step.
+
+        :return: A token to pass to end()
+        """
+        return {"start": time.time(), "perf": time.perf_counter(), "api_calls": self._api_calls}
+
+    def end(self, token, record_type, name, status, **labels):
+        """
+        Record a step started with begin().
+        """
+        self.record(
+            record_type,
+            name,
+            start=token["start"],
+            duration=time.perf_counter() - token["perf"],
+            api_calls=self._api_calls - token["api_calls"],
+            status=status,
+            **labels,
+        )
+
+    @contextmanager
+    def timed(self, record_type, name, **labels):
+        """
+        Measure the block as an operation.
+        """
+        frame = {"api_calls": 0}
+        stack = self._stack()
+        stack.append(frame)
+        start, perf = time.time(), time.perf_counter()
+        status = "failed"
+        try:
+            yield
+            status = "passed"
+        finally:
+            stack.remove(frame)
+            self.record(
+                record_type,
+                name,
+                start=start,
+                duration=time.perf_counter() - perf,
+                api_calls=frame["api_calls"],
+                status=status,
+                **labels,
+            )
+
+    def record(self, record_type, name, **fields):
+        """
+        Write a record.
+        """
+        line = json.dumps({"type": record_type, "name": name, **self.labels, **fields}) + "\n"
+        with self._lock:
+            if self._file:
+                self._file.write(line)
+
+
+METRICS = Metrics()
+
+
+def timed(operation):
+    """
+    Decorate a resource method to be recorded as an operation.
+
+    :param operation: Name of the operation, e.g. "create"
+    """
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(resource, *args, **kwargs):
+            with METRICS.timed("operation", operation, kind=resource.kind, resource=resource.name):
+                return func(resource, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
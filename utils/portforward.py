@@ -0,0 +1,112 @@
+import socket
+import threading
+
+from kubernetes.stream.ws_client import create_websocket, get_websocket_url
+from websocket import ABNF, WebSocketException
+
+KUBEVIRT_PORTFORWARD_PATH = (
+    "/apis/subresources.kubevirt.io/v1/namespaces/{namespace}/virtualmachineinstances/{name}/portforward/{port}/tcp"
+)
+KUBEVIRT_PLAIN_PROTOCOL = "plain.kubevirt.io"
+
+
+class PortForward:
+    """
+    In-process port-forward to a VMI port through the KubeVirt API.
+
+    The forward is a websocket opened with the configuration and credentials
+    of an existing DynamicClient, so no virtctl process is spawned. Callers
+    get one end of a socketpair in sock, e.g. to hand to paramiko, and two
+    threads copy bytes between the other end and the websocket. When one of
+    them ends, the websocket is closed and the other one ends too.
+    """
+
+    def __init__(self, client, name, namespace, port):
+        """
+        Open the port-forward.
+
+        :param client: DynamicClient to take the API configuration from
+        :param name: Name of the VMI
+        :param namespace: Namespace of the VMI
+        :param port: Port in the guest
+        """
+        configuration = client.client.configuration
+        path = KUBEVIRT_PORTFORWARD_PATH.format(namespace=namespace, name=name, port=port)
+        headers = {"sec-websocket-protocol": KUBEVIRT_PLAIN_PROTOCOL}
+        bearer = configuration.auth_settings().get("BearerToken")
+        if bearer:
+            headers["authorization"] = bearer["value"]
+
+        self._ws = create_websocket(configuration, get_websocket_url(configuration.host + path), headers)
+        self.sock, self._peer = socket.socketpair()
+        self._lock = threading.Lock()
+        self._running = 2
+        self._threads = [
+            threading.Thread(target=self._ws_to_sock, name=f"portforward-{name}-rx", daemon=True),
+            threading.Thread(target=self._sock_to_ws, name=f"portforward-{name}-tx", daemon=True),
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def _ws_to_sock(self):
+        """
+        Copy data received from the guest to the local socket.
+        """
+        try:
+            while True:
+                opcode, data = self._ws.recv_data()
+                if opcode == ABNF.OPCODE_CLOSE:
+                    break
+                if data:
+                    self._peer.sendall(data)
+        except (OSError, WebSocketException):
+            pass
+        finally:
+            self._pump_done()
+
+    def _sock_to_ws(self):
+        """
+        Copy data written to the local socket to the guest.
+        """
+        try:
+            while True:
+                data = self._peer.recv(65536)
+                if not data:
+                    break
+                self._ws.send_binary(data)
+        except (OSError, WebSocketException):
+            pass
+        finally:
+            self._pump_done()
+
+    def _shutdown(self):
+        """
+        Tear down both ends of the forward.
+        """
+        try:
+            self._peer.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._ws.close()
+
+    def _pump_done(self):
+        """
+        Tear down the forward when a copy thread ends, and release the local end once both ended.
+
+        The other thread is woken up by the shutdown, so the forward is freed
+        when it breaks, e.g. the guest closes the connection, even if close()
+        is never called.
+        """
+        self._shutdown()
+        with self._lock:
+            self._running -= 1
+            last = not self._running
+        if last:
+            self._peer.close()
+
+    def close(self):
+        """
+        Close the port-forward.
+        """
+        self.sock.close()
+        self._shutdown()
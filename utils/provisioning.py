@@ -0,0 +1,133 @@
+import json
+import time
+
+from utils.stats import histogram, summarize
+from utils.watch import StateTimer, Watcher
+
+# Upper bounds in seconds of the provisioning latency histogram
+LATENCY_BUCKETS = (1, 2, 5, 10, 20, 30, 60, 120, 300, 600)
+
+
+def _phase(obj):
+    return obj.status.phase if obj is not None and obj.status else None
+
+
+class Provisioning:
+    """
+    Create a batch of PVCs or DataVolumes and wait for all of them at once.
+
+    Objects are created concurrently with server-side apply, at most
+    concurrency.max_workers in flight, see ocp.tracker.ResourceTracker.apply.
+    Each one is timed from its own create request to the first event of the
+    namespace watch showing it in the target state, so its latency does not
+    include the time spent creating or waiting for the others. The
+    wait resolves every object from that same watch with a single deadline,
+    instead of one wait and one timeout per object.
+    """
+
+    def __init__(self, objs, state, final_states=None):
+        """
+        Initialize a Provisioning.
+
+        :param objs: Objects of one kind, defined and not created yet.
+        :param state: Phase to time the objects to, e.g. Bound.
+        :param final_states: Phases after which an object is not waited for, state by default.
+        """
+        self.objs = list(objs)
+        self.state = state
+        self.final_states = final_states or (state,)
+        self.timer = StateTimer(state, _phase)
+        self.stragglers = []
+        self._watch = None
+
+    def start(self):
+        """
+        Start timing the objects, before any of them is created.
+        """
+        if self.objs and self._watch is None:
+            self._watch = Watcher.for_client(self.objs[0].client).watch(self.objs[0])
+            self._watch.add_listener(self.timer)
+
+    def track(self, obj):
+        """
+        Time an object from now, right before its create request.
+        """
+        self.timer.track([obj.name], time.time())
+
+    def create(self, context):
+        """
+        Create the objects with server-side apply.
+
+        :raises BehaveScenarioError: If any object cannot be created
+        """
+        if not self.objs:
+            return
+        self.start()
+        try:
+            context.tracker.apply(context, self.objs, before=self.track)
+        except Exception:
+            self.close()
+            raise
+
+    def wait(self, timeout, started_timeout=None):
+        """
+        Wait for every object to reach a final state.
+
+        :param timeout: Time to wait in seconds for all of them.
+        :param started_timeout: Time in seconds after which objects still without phase or Pending are given up on.
+        :return: The stragglers, objects which did not reach a final state.
+        """
+        watcher = Watcher.for_client(self.objs[0].client) if self.objs else None
+        pending = self.objs
+        self.stragglers = []
+        try:
+            if pending and started_timeout:
+                self.stragglers = watcher.wait_for_all(
+                    pending, lambda obj: _phase(obj) not in (None, "Pending"), started_timeout
+                )
+                pending = [obj for obj in pending if obj not in self.stragglers]
+            if pending:
+                self.stragglers += watcher.wait_for_all(pending, lambda obj: _phase(obj) in self.final_states, timeout)
+        finally:
+            self.close()
+        return self.stragglers
+
+    def failed(self):
+        """
+        Get the objects which did not reach the state, stragglers included.
+        """
+        return [obj for obj in self.objs if obj.name not in self.timer.times]
+
+    def close(self):
+        """
+        Stop timing the objects.
+        """
+        if self._watch:
+            self._watch.remove_listener(self.timer)
+            self._watch = None
+
+    def to_dict(self):
+        """
+        Convert the latencies to a JSON serializable dict.
+        """
+        latencies = {obj.name: self.timer.times[obj.name] for obj in self.objs if obj.name in self.timer.times}
+        return {
+            "kind": self.objs[0].kind if self.objs else None,
+            "state": self.state,
+            "count": len(self.objs),
+            "latencies": latencies,
+            "latency": summarize(latencies.values()),
+            "histogram": histogram(latencies.values(), LATENCY_BUCKETS),
+            "stragglers": [obj.name for obj in self.stragglers],
+        }
+
+    def record(self, path):
+        """
+        Append the latencies to a JSON lines file.
+
+        :return: The record written
+        """
+        record = self.to_dict()
+        with open(path, "a") as result_file:
+            result_file.write(json.dumps(record) + "\n")
+        return record
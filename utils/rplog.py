@@ -0,0 +1,105 @@
+import gzip
+import hashlib
+import logging
+import queue
+import threading
+
+from reportportal_client import RPLogHandler
+from reportportal_client.helpers import timestamp
+
+LOGGER = logging.getLogger(__name__)
+
+
+class AsyncRPLogHandler(RPLogHandler):
+    """
+    ReportPortal log handler sending logs from a background thread.
+
+    emit() only formats the record and puts it on a bounded queue, together
+    with the test item it belongs to at that moment, or the one given as
+    rp_item_id in the extra of the record. A single thread hands
+    the queued logs to the ReportPortal client, whose log batcher uploads
+    them as multipart batches. When the queue is full, emit() blocks until
+    there is room again, so a slow ReportPortal slows the tests down instead
+    of growing the memory without bounds.
+
+    Attachments larger than compress_min_size, unless gzipped already, are
+    gzipped. An attachment with the same name and content as one uploaded
+    before, e.g. the manifest of an object defined again with the same spec,
+    is replaced by a note.
+    """
+
+    def __init__(self, rp_client, level=logging.NOTSET, maxsize=1000, compress_min_size=4096):
+        """
+        Initialize the handler and start its thread.
+
+        :param rp_client: ReportPortal client to log with
+        :param maxsize: Maximum number of logs waiting to be sent
+        :param compress_min_size: Size in bytes from which attachments are gzipped
+        """
+        super().__init__(level=level, rp_client=rp_client)
+        self.compress_min_size = compress_min_size
+        self._queue = queue.Queue(maxsize)
+        self._digests = set()
+        self._thread = threading.Thread(target=self._run, name="ksantt-rp-log", daemon=True)
+        self._thread.start()
+
+    def _attachment(self, msg, attachment):
+        """
+        Compress and deduplicate an attachment.
+
+        :return: The message and the attachment to send, None if it was sent before
+        """
+        data = attachment["data"]
+        if isinstance(data, str):
+            data = data.encode()
+        digest = hashlib.sha256(attachment["name"].encode() + b"\0" + data).hexdigest()
+        if digest in self._digests:
+            return f"{msg} (attachment {attachment['name']} unchanged, sha256 {digest[:12]})", None
+        self._digests.add(digest)
+        if len(data) < self.compress_min_size or attachment["mime"] == "application/gzip":
+            return msg, dict(attachment, data=data)
+        return msg, {"name": f"{attachment['name']}.gz", "data": gzip.compress(data), "mime": "application/gzip"}
+
+    def emit(self, record):
+        """
+        Queue a log record.
+        """
+        try:
+            msg = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+
+        attachment = record.__dict__.get("attachment")
+        if attachment:
+            msg, attachment = self._attachment(msg, attachment)
+        self._queue.put(
+            (
+                timestamp(),
+                msg,
+                self._get_rp_log_level(record.levelno),
+                attachment,
+                getattr(record, "rp_item_id", None) or self.rp_client.current_item(),
+            )
+        )
+
+    def _run(self):
+        """
+        Send the queued logs.
+        """
+        while True:
+            time, msg, level, attachment, item_id = self._queue.get()
+            try:
+                self.rp_client.log(time, msg, level=level, attachment=attachment, item_id=item_id)
+            except Exception as exc:
+                LOGGER.warning(f"Failed to send log to ReportPortal: {exc}")
+            finally:
+                self._queue.task_done()
+
+    def flush(self):
+        """
+        Wait until every queued log was handed to the ReportPortal client.
+
+        The client uploads its last, partial batch when the launch finishes.
+        """
+        self._queue.join()
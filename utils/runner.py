@@ -0,0 +1,200 @@
+import os
+import shutil
+import subprocess
+import sys
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser
+from datetime import datetime
+from pathlib import Path
+
+from behave.parser import parse_file
+from behave_reportportal.behave_agent import BehaveAgent, create_rp_service
+from behave_reportportal.config import RP_CFG_SECTION, Config
+
+import utils
+
+ROOT = Path(__file__).parent.parent
+RESULT_DIR_ENV = "KSANTT_RESULT_DIR"
+RUN_ID_ENV = "KSANTT_RUN_ID"
+SPLITS = ("feature", "scenario")
+
+
+def work_items(paths, split="feature"):
+    """
+    Split feature files into units of work for the workers.
+
+    :param paths: Feature files or directories holding feature files
+    :param split: "feature" for one item per feature file, "scenario" for one
+        item per scenario and per scenario outline row
+    :return: A list of (item name, behave location) tuples
+    """
+    files = []
+    for path in (Path(path).resolve() for path in paths):
+        files.extend(sorted(path.rglob("*.feature")) if path.is_dir() else [path])
+
+    items = []
+    for path in files:
+        if split == "feature":
+            items.append((path.stem, str(path)))
+            continue
+        feature = parse_file(str(path))
+        if feature is None:
+            continue
+        for scenario in feature.walk_scenarios():
+            items.append((f"{path.stem}-{scenario.line}", f"{path}:{scenario.line}"))
+    return items
+
+
+def start_rp_launch(config_file):
+    """
+    Start the ReportPortal launch shared by all workers.
+
+    Configuration is read like the logger fixture does: from the report_portal
+    section of behave.ini, with the rp_* environment variables as fallback.
+
+    :return: The BehaveAgent owning the launch and the launch UUID, (None, None)
+        if ReportPortal is not configured
+    """
+    parser = ConfigParser()
+    parser.read(config_file)
+    rp_cfg = Config(**(parser[RP_CFG_SECTION] if parser.has_section(RP_CFG_SECTION) else {}))
+    rp_cfg.api_key = rp_cfg.api_key or os.getenv("rp_api_key")
+    rp_cfg.endpoint = rp_cfg.endpoint or os.getenv("rp_endpoint")
+    rp_cfg.project = rp_cfg.project or os.getenv("rp_project")
+    rp_cfg.enabled = all([rp_cfg.endpoint, rp_cfg.project, rp_cfg.api_key])
+    rp_client = create_rp_service(rp_cfg)
+    if rp_client is None:
+        return None, None
+    rp_agent = BehaveAgent(rp_cfg, rp_client)
+    rp_agent.start_launch(None)
+    return rp_agent, rp_client.launch_uuid
+
+
+def merge_tree(src, dst):
+    """
+    Move the files of src into dst, keeping their relative paths.
+    """
+    for path in sorted(src.rglob("*")):
+        if path.is_file():
+            target = dst / path.relative_to(src)
+            target.parent.mkdir(mode=0o755, parents=True, exist_ok=True)
+            shutil.move(path, target)
+    shutil.rmtree(src)
+
+
+def merge_junit(junit_dirs, path):
+    """
+    Merge the JUnit reports of the workers into a single testsuites document.
+    """
+    testsuites = ET.Element("testsuites")
+    totals = dict.fromkeys(("tests", "errors", "failures", "skipped"), 0)
+    for junit_dir in junit_dirs:
+        for report in sorted(junit_dir.glob("*.xml")):
+            testsuite = ET.parse(report).getroot()
+            for key in totals:
+                totals[key] += int(testsuite.get(key, 0))
+            testsuites.append(testsuite)
+    for key, value in totals.items():
+        testsuites.set(key, str(value))
+    ET.ElementTree(testsuites).write(path, encoding="unicode", xml_declaration=True)
+
+
+class Runner:
+    """
+    Run behave work items in parallel, one behave process per item.
+
+    Every feature already runs in its own random namespace with its own
+    StorageClass, so items do not interfere. Each worker writes to its own
+    result directory under <run>/workers/; once all of them are done, their
+    trees are merged into the run directory, which then looks like the
+    result of a serial run: the feature directories, one metrics.jsonl and
+    one junit.xml. The console output of each worker is kept in
+    <run>/workers/<item>.log.
+    """
+
+    def __init__(self, items, workers=4, behave_args=(), result_dir=None, config_file=None):
+        """
+        Initialize the runner.
+
+        :param items: Work items returned by work_items
+        :param workers: Number of behave processes running at the same time
+        :param behave_args: Extra arguments for every behave process
+        :param result_dir: Run directory, results/ksantt-<timestamp> by default
+        :param config_file: behave configuration file with the ReportPortal settings
+        """
+        self.items = items
+        self.workers = workers
+        self.behave_args = list(behave_args)
+        self.result_dir = Path(result_dir or ROOT / "results" / f"ksantt-{datetime.now().isoformat()}")
+        self.config_file = config_file or ROOT / "behave.ini"
+        self.launch_id = None
+        self.run_id = os.getenv(RUN_ID_ENV) or utils.generate_random_string(8)
+
+    def _worker_dir(self, name):
+        """
+        Get the result directory of the worker running the item name.
+        """
+        return self.result_dir / "workers" / name
+
+    def _run_item(self, item):
+        """
+        Run one work item in a behave process.
+
+        :return: The return code of behave
+        """
+        name, location = item
+        worker_dir = self._worker_dir(name)
+        worker_dir.mkdir(mode=0o755, parents=True)
+        command = [
+            sys.executable,
+            "-m",
+            "behave",
+            location,
+            "--junit",
+            f"--junit-directory={worker_dir / 'junit'}",
+            *self.behave_args,
+        ]
+        if self.launch_id:
+            command.append(f"-Dlaunch_id={self.launch_id}")
+        env = dict(os.environ, **{RESULT_DIR_ENV: str(worker_dir), RUN_ID_ENV: self.run_id})
+        with open(worker_dir.with_suffix(".log"), "w") as log:
+            return subprocess.run(command, cwd=ROOT, env=env, stdout=log, stderr=subprocess.STDOUT).returncode
+
+    def _merge(self):
+        """
+        Merge the worker result directories into the run directory.
+        """
+        junit_dirs = []
+        with open(self.result_dir / "metrics.jsonl", "a") as metrics:
+            for name, _ in self.items:
+                worker_dir = self._worker_dir(name)
+                if not worker_dir.is_dir():
+                    continue
+                worker_metrics = worker_dir / "metrics.jsonl"
+                if worker_metrics.exists():
+                    metrics.write(worker_metrics.read_text())
+                    worker_metrics.unlink()
+                junit_dir = worker_dir / "junit"
+                if junit_dir.is_dir():
+                    junit_dirs.append(self.result_dir / "junit" / name)
+                    merge_tree(junit_dir, junit_dirs[-1])
+                merge_tree(worker_dir, self.result_dir)
+        merge_junit(junit_dirs, self.result_dir / "junit.xml")
+
+    def run(self):
+        """
+        Run all work items and merge their results.
+
+        :return: 0 if every behave process passed, the highest return code otherwise
+        """
+        self.result_dir.mkdir(mode=0o755, parents=True, exist_ok=True)
+        rp_agent, self.launch_id = start_rp_launch(self.config_file)
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ksantt") as executor:
+                return_codes = list(executor.map(self._run_item, self.items))
+        finally:
+            if rp_agent is not None:
+                rp_agent.finish_launch(None)
+        self._merge()
+        return max(return_codes, default=0)
@@ -0,0 +1,146 @@
+import time
+
+from utils.stats import summarize
+
+# Objects and the state each of them is timed to, see Wave
+MILESTONES = ("bound", "succeeded", "running")
+
+
+def parse_waves(waves):
+    """
+    Parse the wave sizes of the scale configuration.
+
+    :param waves: List of sizes, or a comma-separated string of them as given with -D scale.waves=1,2,4
+    :return: List of ints
+    """
+    if isinstance(waves, str):
+        waves = waves.split(",")
+    return [int(size) for size in waves]
+
+
+class Wave:
+    """
+    Result of one wave of a scale ramp.
+    """
+
+    def __init__(self, number, vms, volumes):
+        """
+        Initialize a Wave.
+
+        :param number: Position of the wave in the ramp, from 1.
+        :param vms: Number of VMs created by the wave.
+        :param volumes: Number of PVCs created by the wave.
+        """
+        self.number = number
+        self.vms = vms
+        self.volumes = volumes
+        self.latencies = {milestone: [] for milestone in MILESTONES}
+        self.api_calls = 0
+        self.api_errors = 0
+        self.driver_errors = 0
+        self.wall_time = None
+        self.error = None
+
+    def p95(self, milestone):
+        """
+        Get the p95 latency of a milestone, None if no object reached it.
+        """
+        return summarize(self.latencies[milestone]).get("p95")
+
+    def to_dict(self):
+        """
+        Convert the wave to a JSON serializable dict.
+        """
+        objects = self.vms + self.volumes
+        return {
+            "wave": self.number,
+            "vms": self.vms,
+            "volumes": self.volumes,
+            "latencies": self.latencies,
+            "latency": {milestone: summarize(values) for milestone, values in self.latencies.items()},
+            "api_calls": self.api_calls,
+            "api_errors": self.api_errors,
+            "api_error_rate": self.api_errors / self.api_calls if self.api_calls else 0,
+            "driver_errors": self.driver_errors,
+            "driver_error_rate": self.driver_errors / objects if objects else 0,
+            "wall_time": self.wall_time,
+            "error": self.error,
+        }
+
+
+def find_knee(waves, milestone="bound", factor=2.0):
+    """
+    Find the wave from which latency degrades.
+
+    The knee is the first wave whose p95 latency of milestone exceeds factor
+    times the p95 of the first wave, or which failed.
+
+    :param waves: Waves in ramp order.
+    :return: The knee Wave, None if latency did not degrade.
+    """
+    baseline = waves[0].p95(milestone) if waves else None
+    for wave in waves:
+        if wave.error:
+            return wave
+        p95 = wave.p95(milestone)
+        if baseline and p95 is not None and p95 > factor * baseline:
+            return wave
+    return None
+
+
+class ScaleRamp:
+    """
+    Run waves of increasing size until one fails.
+
+    The ramp does not know how a wave is run, run_wave creates the objects,
+    waits for them and cleans them up, so the ramp can be driven by behave
+    steps against a cluster or by a stand-in.
+    """
+
+    def __init__(self, sizes, volumes_per_vm, run_wave, knee_factor=2.0):
+        """
+        Initialize the ramp.
+
+        :param sizes: Number of VMs of each wave.
+        :param volumes_per_vm: Number of PVCs per VM.
+        :param run_wave: Callable given a Wave, filling in its measurements.
+        :param knee_factor: See find_knee.
+        """
+        self.sizes = list(sizes)
+        self.volumes_per_vm = volumes_per_vm
+        self.run_wave = run_wave
+        self.knee_factor = knee_factor
+        self.waves = []
+
+    def run(self):
+        """
+        Run the waves, stopping after the first failed one.
+
+        :return: The waves run.
+        """
+        self.waves = []
+        for number, size in enumerate(self.sizes, start=1):
+            wave = Wave(number, size, size * self.volumes_per_vm)
+            self.waves.append(wave)
+            start = time.perf_counter()
+            try:
+                self.run_wave(wave)
+            except Exception as exc:
+                wave.error = str(exc)
+            finally:
+                wave.wall_time = time.perf_counter() - start
+            if wave.error:
+                break
+        return self.waves
+
+    def knees(self):
+        """
+        Get the knee of every milestone.
+
+        :return: dict mapping each milestone to the number of VMs of its knee wave, or None
+        """
+        knees = {}
+        for milestone in MILESTONES:
+            knee = find_knee(self.waves, milestone, self.knee_factor)
+            knees[milestone] = knee.vms if knee else None
+        return knees
@@ -0,0 +1,160 @@
+import base64
+import secrets
+import select
+import threading
+from collections import namedtuple
+from contextlib import contextmanager
+
+import paramiko
+
+CommandResult = namedtuple("CommandResult", ["rc", "stdout", "stderr"])
+READ_SIZE = 32768
+# Time in seconds between two looks at a channel without new output, e.g. when only stderr is written
+READ_INTERVAL = 0.1
+
+
+def build_batch_script(commands):
+    """
+    Build a shell script running commands one after another in a single session.
+
+    Each command runs in its own subshell. After it, a marker line with its
+    index and return code is printed, followed by its stdout and stderr,
+    base64-encoded on one line each.
+
+    :param commands: Shell commands to run
+    :return: The script and the marker to parse its output with
+    """
+    marker = f"__ksantt_{secrets.token_hex(8)}__"
+    lines = ["d=$(mktemp -d) || exit 1", "trap 'rm -rf \"$d\"' EXIT"]
+    for index, command in enumerate(commands):
+        lines += [
+            f'(\n{command}\n) >"$d/out" 2>"$d/err" </dev/null',
+            f"printf '%s %d %d\\n' {marker} {index} $?",
+            # Not base64 -w0, busybox does not know -w
+            "base64 \"$d/out\" | tr -d '\\n'; echo",
+            "base64 \"$d/err\" | tr -d '\\n'; echo",
+        ]
+    return "\n".join(lines) + "\n", marker
+
+
+def read_channel(channel):
+    """
+    Read the stdout and stderr of a command until it exits.
+
+    Both streams are drained as their data arrives, so a command writing
+    more than the channel window to one of them does not block while the
+    other one is read.
+
+    :param channel: Channel the command was started on
+    :return: stdout, stderr and return code of the command, as (bytes, bytes, int)
+    """
+    stdout, stderr = [], []
+    channel.set_combine_stderr(False)
+    while True:
+        received = False
+        if channel.recv_ready():
+            stdout.append(channel.recv(READ_SIZE))
+            received = True
+        if channel.recv_stderr_ready():
+            stderr.append(channel.recv_stderr(READ_SIZE))
+            received = True
+        if received:
+            continue
+        # Output is received before the exit status, nothing is left once it is there
+        if channel.exit_status_ready() and not channel.recv_ready() and not channel.recv_stderr_ready():
+            break
+        select.select([channel], [], [], READ_INTERVAL)
+    return b"".join(stdout), b"".join(stderr), channel.recv_exit_status()
+
+
+def parse_batch_output(output, marker, count):
+    """
+    Parse the output of a script built by build_batch_script.
+
+    :param output: Standard output of the script
+    :param marker: Marker returned by build_batch_script
+    :param count: Number of commands in the script
+    :return: A CommandResult per command, None for commands that did not run
+    """
+    results = [None] * count
+    lines = output.splitlines()
+    for number, line in enumerate(lines):
+        fields = line.split()
+        if len(fields) != 3 or fields[0] != marker or number + 2 >= len(lines):
+            continue
+        stdout, stderr = (base64.b64decode(data).decode().strip() for data in lines[number + 1 : number + 3])
+        results[int(fields[1])] = CommandResult(int(fields[2]), stdout, stderr)
+    return results
+
+
+class SSHSessionPool:
+    """
+    Keep an authenticated SSH transport to a guest open across steps.
+
+    Channels are checked out of the transport one per command, so many
+    commands share a single connection. The transport is health-checked on
+    every checkout and reconnected when it is gone.
+    """
+
+    def __init__(self, connect, max_sessions=10):
+        """
+        Initialize the pool.
+
+        :param connect: Callable returning a connected paramiko.SSHClient
+        :param max_sessions: Maximum number of channels open at the same time (sshd MaxSessions)
+        """
+        self._connect = connect
+        self._client = None
+        self._lock = threading.Lock()
+        self._sessions = threading.BoundedSemaphore(max_sessions)
+
+    @staticmethod
+    def _healthy(client):
+        """
+        Check whether the transport of client is still usable.
+        """
+        transport = client.get_transport() if client else None
+        if transport is None or not transport.is_active():
+            return False
+        try:
+            transport.send_ignore()
+        except (EOFError, OSError, paramiko.SSHException):
+            return False
+        return True
+
+    def connect(self, reconnect=False):
+        """
+        Get the pooled SSHClient, connecting if there is no healthy one.
+
+        :param reconnect: Whether to drop the current connection first.
+        """
+        with self._lock:
+            if reconnect or not self._healthy(self._client):
+                if self._client:
+                    self._client.close()
+                self._client = self._connect()
+            return self._client
+
+    @contextmanager
+    def channel(self):
+        """
+        Check out a session channel from the pooled transport.
+        """
+        with self._sessions:
+            try:
+                channel = self.connect().get_transport().open_session()
+            except (EOFError, OSError, paramiko.SSHException):
+                channel = self.connect(reconnect=True).get_transport().open_session()
+            try:
+                yield channel
+            finally:
+                channel.close()
+
+    def close(self):
+        """
+        Close the pooled connection.
+        """
+        with self._lock:
+            if self._client:
+                self._client.close()
+                self._client = None
@@ -0,0 +1,51 @@
+import math
+import statistics
+
+
+def percentile(values, q):
+    """
+    Get the q-th percentile of values, with linear interpolation.
+
+    :param values: Numbers to take the percentile of
+    :param q: Percentile, between 0 and 100
+    """
+    values = sorted(values)
+    if not values:
+        return None
+    rank = (len(values) - 1) * q / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return values[low] + (values[high] - values[low]) * (rank - low)
+
+
+def summarize(values):
+    """
+    Summarize a distribution of numbers.
+
+    :return: dict with count, min, mean, median, p95 and max, or only the count if values is empty
+    """
+    values = list(values)
+    if not values:
+        return {"count": 0}
+    return {
+        "count": len(values),
+        "min": min(values),
+        "mean": statistics.mean(values),
+        "median": statistics.median(values),
+        "p95": percentile(values, 95),
+        "max": max(values),
+    }
+
+
+def histogram(values, buckets):
+    """
+    Count values per bucket.
+
+    :param values: Numbers to count
+    :param buckets: Increasing upper bounds of the buckets, values above the last one are counted in "+Inf"
+    :return: dict mapping the upper bound of each bucket, as a string, to the number of values in it
+    """
+    counts = dict.fromkeys([str(bound) for bound in buckets] + ["+Inf"], 0)
+    for value in values:
+        bound = next((bound for bound in buckets if value <= bound), "+Inf")
+        counts[str(bound)] += 1
+    return counts
@@ -1,21 +1,29 @@
 import json
 
+LSBLK_COLUMNS = "NAME,SERIAL,SIZE,TYPE,MOUNTPOINT"
 
-def get_disks(vm, session):
-    disks = vm.cmd_output("lsblk -d -o NAME --noheadings", session).splitlines()
-    return set(disks)
 
+def get_block_devices(vm):
+    """Get the whole-disk block devices of the VM with a single lsblk call."""
+    output = vm.cmd_output(f"lsblk -d -J -o {LSBLK_COLUMNS}")
+    return json.loads(output)["blockdevices"]
 
-def get_disk_info(vm, session, disk):
+
+def get_disks(vm):
+    return {device["name"] for device in get_block_devices(vm)}
+
+
+def get_disk_info(vm, disk):
     """Helper function to get the info of a disk."""
-    output = vm.cmd_output(f"lsblk -d -o NAME,SERIAL -J /dev/{disk}", session)
-    json_output = json.loads(output)
-    return json_output["blockdevices"][0]
+    for device in get_block_devices(vm):
+        if device["name"] == disk:
+            return device
+    return None
 
 
-def get_disk_by_serial(vm, session, serial):
+def get_disk_by_serial(vm, serial):
     """Find a disk by its serial number."""
-    for disk in get_disks(vm, session):
-        if get_disk_info(vm, session, disk).get("serial") == serial:
-            return disk
+    for device in get_block_devices(vm):
+        if device.get("serial") == serial:
+            return device["name"]
     return None
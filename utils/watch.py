@@ -0,0 +1,381 @@
+import logging
+import threading
+import time
+
+from kubernetes import watch
+from kubernetes.client.exceptions import ApiException
+from kubernetes.dynamic.resource import ResourceInstance
+from timeout_sampler import TimeoutExpiredError
+
+LOGGER = logging.getLogger(__name__)
+
+HTTP_STATUS_GONE = 410
+
+
+class ResourceWatch:
+    """
+    Follow every object of one kind in one namespace through a watch stream.
+
+    The objects are listed once, then kept current from watch events. The
+    stream is resumed from the last seen resourceVersion and re-listed when
+    the server reports that version as gone. Waiters are woken up on every
+    event instead of polling the API server.
+    """
+
+    def __init__(self, client, resource, namespace=None, timeout=60):
+        """
+        Start following the objects.
+
+        :param client: DynamicClient used for the list and watch calls
+        :param resource: Dynamic API resource, e.g. client.resources.get(...)
+        :param namespace: Namespace to follow, None for cluster-scoped kinds
+        :param timeout: Server-side timeout of a single watch request
+        """
+        self.client = client
+        self.resource = resource
+        self.kind = resource.kind
+        self.namespace = namespace
+        self.timeout = timeout
+        self.objects = {}
+        self.resource_version = None
+        self._synced = False
+        # Reentrant, listeners may read the watch
+        self._cond = threading.Condition(threading.RLock())
+        self._stopped = threading.Event()
+        self._watcher = None
+        self._listeners = []
+        self._thread = threading.Thread(
+            target=self._run,
+            name=f"watch-{self.kind}-{self.namespace}",
+            daemon=True,
+        )
+        self._thread.start()
+
+    def _list(self):
+        """
+        List the objects and remember the resourceVersion to watch from.
+        """
+        result = self.client.get(self.resource, namespace=self.namespace)
+        objects = {}
+        for item in result.to_dict()["items"]:
+            obj = ResourceInstance(self.resource, item)
+            objects[obj.metadata.name] = obj
+        with self._cond:
+            self.objects = objects
+            self.resource_version = result.metadata.resourceVersion
+            self._synced = True
+            for obj in objects.values():
+                self._notify("SYNC", obj)
+            self._cond.notify_all()
+
+    def _handle(self, event):
+        """
+        Apply a watch event to the known objects and wake up the waiters.
+
+        Listeners run before the waiters are woken up, so a waiter seeing an
+        object in a state also sees what the listeners recorded for it.
+        """
+        obj = event["object"]
+        with self._cond:
+            self.resource_version = obj.metadata.resourceVersion
+            if event["type"] == "DELETED":
+                self.objects.pop(obj.metadata.name, None)
+            else:
+                self.objects[obj.metadata.name] = obj
+            self._notify(event["type"], obj)
+            self._cond.notify_all()
+
+    def _notify(self, event_type, obj):
+        """
+        Pass an event to the listeners, with the lock held.
+        """
+        for listener in list(self._listeners):
+            try:
+                listener(event_type, obj)
+            except Exception as exc:
+                LOGGER.warning(f"{self.kind} watch listener {listener} failed: {exc}")
+
+    def add_listener(self, listener):
+        """
+        Call listener(event_type, obj) from the watch thread on every event.
+
+        event_type is the watch event type, or SYNC for objects found by a (re-)list.
+        Listeners are called with the lock of the watch held and must not block.
+        """
+        with self._cond:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        """
+        Stop calling listener, once the event being passed to it, if any, is handled.
+        """
+        with self._cond:
+            self._listeners.remove(listener)
+
+    def _run(self):
+        """
+        List and watch until stopped.
+        """
+        while not self._stopped.is_set():
+            try:
+                if self.resource_version is None:
+                    self._list()
+                self._watcher = watch.Watch()
+                for event in self.client.watch(
+                    self.resource,
+                    namespace=self.namespace,
+                    resource_version=self.resource_version,
+                    timeout=self.timeout,
+                    watcher=self._watcher,
+                ):
+                    self._handle(event)
+            except ApiException as exc:
+                if exc.status == HTTP_STATUS_GONE:
+                    LOGGER.debug(f"{self.kind} watch in {self.namespace} expired, re-listing")
+                    self.resource_version = None
+                    continue
+                LOGGER.warning(f"{self.kind} watch in {self.namespace} failed: {exc}")
+                self._stopped.wait(1)
+            except Exception as exc:
+                LOGGER.warning(f"{self.kind} watch in {self.namespace} failed: {exc}")
+                self._stopped.wait(1)
+
+    def get(self, name, timeout=30):
+        """
+        Get the cached object called name.
+
+        :param name: Name of the object
+        :param timeout: Time to wait for the initial list in seconds
+        :return: The object, None if it is not known to the cache
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._synced, timeout=timeout)
+            return self.objects.get(name)
+
+    def select(self, labels, timeout=30):
+        """
+        Get the names of the cached objects carrying labels.
+
+        :param labels: dict of labels the objects must all have
+        :param timeout: Time to wait for the initial list in seconds
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self._synced, timeout=timeout)
+            return [
+                name
+                for name, obj in self.objects.items()
+                if obj.metadata.labels and all(obj.metadata.labels[key] == value for key, value in labels.items())
+            ]
+
+    def wait_for(self, name, predicate, timeout):
+        """
+        Wait until predicate holds for the object called name.
+
+        :param name: Name of the object
+        :param predicate: Callable given the object, or None while it does not exist
+        :param timeout: Time to wait in seconds
+        :return: The object satisfying the predicate, None if it does not exist
+        :raises TimeoutExpiredError: If the predicate does not hold within timeout
+        """
+        start_time = time.monotonic()
+        with self._cond:
+            if not self._cond.wait_for(lambda: self._synced and predicate(self.objects.get(name)), timeout=timeout):
+                raise TimeoutExpiredError(
+                    f"{self.kind} {name} in {self.namespace}",
+                    elapsed_time=time.monotonic() - start_time,
+                )
+            return self.objects.get(name)
+
+    def wait_for_all(self, names, predicate, timeout):
+        """
+        Wait until predicate holds for every object in names.
+
+        All objects are checked on every event of the stream, so waiting for
+        many objects costs no more than waiting for one.
+
+        :param names: Names of the objects
+        :param predicate: Callable given the object, or None while it does not exist
+        :param timeout: Time to wait in seconds for all of them
+        :return: Names of the objects for which predicate does not hold after timeout, empty on success
+        """
+        pending = set(names)
+
+        def _done():
+            if self._synced:
+                pending.difference_update([name for name in pending if predicate(self.objects.get(name))])
+            return not pending
+
+        with self._cond:
+            self._cond.wait_for(_done, timeout=timeout)
+            return sorted(pending)
+
+    def stop(self):
+        """
+        Stop following the objects.
+        """
+        self._stopped.set()
+        if self._watcher:
+            self._watcher.stop()
+
+
+class StateTimer:
+    """
+    Record when objects followed by a ResourceWatch first reach a state.
+
+    The timer is a listener of the watch, so every object is timed from the
+    same event stream without polling. Times are relative to the start given
+    to track().
+    """
+
+    def __init__(self, state, get_state):
+        """
+        Initialize a StateTimer.
+
+        :param state: State to time, e.g. Bound
+        :param get_state: Callable getting the state of an object from the watch
+        """
+        self.state = state
+        self.get_state = get_state
+        self.times = {}
+        self._start = {}
+        self._lock = threading.Lock()
+
+    def track(self, names, start):
+        """
+        Time the objects called names from start, a time.time() timestamp.
+        """
+        with self._lock:
+            for name in names:
+                self._start[name] = start
+
+    def __call__(self, event_type, obj):
+        name = obj.metadata.name
+        with self._lock:
+            if name not in self._start or name in self.times:
+                return
+            if obj.status and self.get_state(obj) == self.state:
+                self.times[name] = time.time() - self._start[name]
+
+    def durations(self, names):
+        """
+        Get the times of the objects called names that reached the state.
+        """
+        with self._lock:
+            return [self.times[name] for name in names if name in self.times]
+
+
+class Watcher:
+    """
+    Shared wait subsystem and object cache built on watch streams.
+
+    There is one Watcher per DynamicClient and one ResourceWatch per resource
+    kind per namespace, shared by every reader and waiter in the process.
+    """
+
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, client):
+        """
+        Initialize a Watcher for a DynamicClient.
+        """
+        self.client = client
+        self._watches = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_client(cls, client):
+        """
+        Get the Watcher shared by every user of client.
+        """
+        with cls._instances_lock:
+            if client not in cls._instances:
+                cls._instances[client] = cls(client)
+            return cls._instances[client]
+
+    def watch(self, resource):
+        """
+        Get the ResourceWatch following the kind and namespace of resource.
+
+        :param resource: An ocp_resources object
+        """
+        return self.watch_kind(resource.api, getattr(resource, "namespace", None))
+
+    def watch_kind(self, api, namespace=None):
+        """
+        Get the ResourceWatch following a kind in a namespace.
+
+        :param api: Dynamic API resource, e.g. client.resources.get(...)
+        :param namespace: Namespace to follow, None for cluster-scoped kinds
+        """
+        key = (api.group_version, api.kind, namespace)
+        with self._lock:
+            if key not in self._watches:
+                self._watches[key] = ResourceWatch(self.client, api, namespace=namespace)
+            return self._watches[key]
+
+    def get(self, resource):
+        """
+        Get the cached object of resource, None if it is not known to the cache.
+        """
+        return self.watch(resource).get(resource.name)
+
+    def wait_for(self, resource, predicate, timeout):
+        """
+        Wait until predicate holds for resource.
+
+        See ResourceWatch.wait_for.
+        """
+        return self.watch(resource).wait_for(resource.name, predicate, timeout)
+
+    def wait_for_status(self, resource, status, timeout, stop_status=None):
+        """
+        Wait for the status.phase of resource to be status.
+
+        :raises TimeoutExpiredError: If status is not reached within timeout, or stop_status is reached
+        """
+        stop_status = stop_status or resource.Status.FAILED
+        resource.logger.info(f"Wait for {resource.kind} {resource.name} status to be {status}")
+
+        def _phase(obj):
+            return obj.status.phase if obj is not None and obj.status else None
+
+        obj = self.wait_for(resource, lambda obj: _phase(obj) in (status, stop_status), timeout)
+        if _phase(obj) == stop_status:
+            raise TimeoutExpiredError(f"Status of {resource.kind} {resource.name} is {stop_status}")
+        return obj
+
+    def wait_for_all(self, resources, predicate, timeout):
+        """
+        Wait until predicate holds for every resource.
+
+        Resources are grouped by watch and share a single deadline.
+
+        :return: The resources for which predicate does not hold after timeout, empty on success
+        """
+        groups = {}
+        for resource in resources:
+            groups.setdefault(self.watch(resource), []).append(resource)
+        deadline = time.monotonic() + timeout
+        stragglers = []
+        for resource_watch, group in groups.items():
+            pending = resource_watch.wait_for_all(
+                [resource.name for resource in group], predicate, max(deadline - time.monotonic(), 0)
+            )
+            stragglers.extend(resource for resource in group if resource.name in pending)
+        return stragglers
+
+    def wait_deleted(self, resource, timeout):
+        """
+        Wait until resource no longer exists.
+        """
+        self.wait_for(resource, lambda obj: obj is None, timeout)
+
+    def stop(self, namespace=None):
+        """
+        Stop the watches of a namespace, or all of them.
+        """
+        with self._lock:
+            for key in list(self._watches):
+                if namespace is None or key[2] == namespace:
+                    self._watches.pop(key).stop()